@@ -1,6 +1,23 @@
 from django.contrib import admin
 from .models import *
-from unfold.admin import ModelAdmin
+from core.admin import ScalableModelAdmin
 # Register your models here.
 
-admin.site.register(User, ModelAdmin)
+
+@admin.register(User)
+class UserAdmin(ScalableModelAdmin):
+    list_display = ('email', 'name', 'role', 'is_active', 'block', 'date_joined')
+    list_filter = ('role', 'is_active', 'block')
+    # Prefix search can use the email index, a contains search can't.
+    search_fields = ('^email',)
+    ordering = ('-date_joined', '-id')
+    autocomplete_fields = ('groups',)
+
+
+@admin.register(OTP)
+class OTPAdmin(ScalableModelAdmin):
+    list_display = ('user', 'created_at', 'attempt_count', 'last_tried')
+    list_select_related = ('user',)
+    search_fields = ('^user__email',)
+    ordering = ('-created_at', '-id')
+    autocomplete_fields = ('user',)
@@ -1,22 +1,32 @@
 from django.utils import timezone
 from datetime import timedelta
-from .models import OTP, User
-from django.core.mail import send_mail
+from .models import User
+from .otp import get_otp_store
+from .tasks import send_otp_email, fetch_avatar
+from django.contrib.auth.hashers import make_password
 from django.conf import settings
+from asgiref.sync import sync_to_async
+from core.http import get_async_client
+from core.jwks import get_jwks
+import asyncio
+import jwt
 import json
 
-def send_otp(email, task="verification"):
+GOOGLE_TOKENINFO_URL = "https://www.googleapis.com/oauth2/v3/tokeninfo"
+GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
+APPLE_JWKS_URL = "https://appleid.apple.com/auth/keys"
+
+# The OTP and sign-in flows carry no token to pin a client to the primary
+# on, and the sign-up or reset just before them may not have reached the
+# replicas yet, so they read from the primary.
+async def send_otp(email, task="verification"):
     try:
-        user = User.objects.get(email=email)
-        otp_obj = OTP.generate_otp(user)
-        
-        subject = f"Your OTP for {task}"
-        message = f"Your OTP code is {otp_obj.otp}. It will expire in 3 minutes."
-        email_from = settings.EMAIL_HOST_USER
-        recipient_list = [email]
-        
-        send_mail(subject, message, email_from, recipient_list)
-        
+        user = await User.objects.using('default').aget(email=email)
+        otp_code = await sync_to_async(get_otp_store().issue)(user)
+
+        # Delivery happens on the celery worker, the request only enqueues it.
+        await sync_to_async(send_otp_email.delay)(email, otp_code, task)
+
         return {"status": True, "log": f"OTP sent successfully to {email}"}
     except User.DoesNotExist:
         return {"status": False, "log": "User with this email does not exist."}
@@ -24,52 +34,47 @@ def send_otp(email, task="verification"):
         return {"status": False, "log": str(e)}
 
 
-def verify_otp(email, otp_code):
+async def verify_otp(email, otp_code):
+    result = await sync_to_async(get_otp_store().verify)(email, otp_code)
+    if not result['status']:
+        return result
+
+    # OTP verified, activate user
     try:
-        otp_obj = OTP.objects.filter(user__email=email).latest('created_at')
-    except OTP.DoesNotExist:
+        user = await User.objects.using('default').aget(email=email)
+    except User.DoesNotExist:
         return {"status": False, "log": "Invalid OTP or email."}
 
-    # Check expiry
-    if otp_obj.is_expired():
-        return {"status": False, "log": "OTP has expired."}
+    if not user.is_active:
+        user.is_active = True
+        await user.asave()
 
-    # Verify OTP
-    if otp_obj.otp != otp_code:
-        return {"status": False, "log": "Invalid OTP."}
+    return result
 
-    # OTP verified, activate user & delete OTP
-    user = otp_obj.user
-    user.is_active = True
-    user.save()
-    otp_obj.delete()
 
-    return {"status": True, "log": "OTP verified statusfully."}
-
-
-def google_login(access_token):
+async def google_login(access_token):
 
     if not access_token:
         return None, "Access token is required"
 
     try:
-        # Validate token
-        token_info_response = requests.get(
-            "https://www.googleapis.com/oauth2/v3/tokeninfo",
-            params={"access_token": access_token},
-            timeout=10
+        client = get_async_client()
+
+        # Validate token and get user info concurrently
+        token_info_response, user_info_response = await asyncio.gather(
+            client.get(
+                GOOGLE_TOKENINFO_URL,
+                params={"access_token": access_token},
+            ),
+            client.get(
+                GOOGLE_USERINFO_URL,
+                headers={"Authorization": f"Bearer {access_token}"},
+            ),
         )
 
         if token_info_response.status_code != 200:
             return None, "Invalid access token"
 
-        # Get user info
-        user_info_response = requests.get(
-            "https://www.googleapis.com/oauth2/v2/userinfo",
-            headers={"Authorization": f"Bearer {access_token}"},
-            timeout=10
-        )
-
         if user_info_response.status_code != 200:
             return None, "Failed to fetch user info"
 
@@ -82,7 +87,7 @@ def google_login(access_token):
         if not email:
             return None, "Email not provided by Google"
 
-        user, created = User.objects.get_or_create(
+        user, created = await User.objects.aget_or_create(
             email=email,
             defaults={
                 "name": name,
@@ -91,16 +96,9 @@ def google_login(access_token):
             },
         )
 
-        # Save profile image
+        # Profile image is fetched in the background
         if created and profile_image_url:
-            img_response = requests.get(profile_image_url)
-            if img_response.status_code == 200:
-                file_name = f"{slugify(name)}-profile.jpg"
-                user.image.save(
-                    file_name,
-                    ContentFile(img_response.content),
-                    save=True,
-                )
+            await sync_to_async(fetch_avatar.delay)(str(user.pk), profile_image_url)
 
         if getattr(user, "block", False):
             return None, "User account is disabled"
@@ -111,7 +109,7 @@ def google_login(access_token):
         return None, str(e)
 
 
-def apple_login(identity_token, user_info_raw):
+async def apple_login(identity_token, user_info_raw):
     try:
         user_info = {}
         if user_info_raw:
@@ -121,18 +119,16 @@ def apple_login(identity_token, user_info_raw):
                 pass
 
         if not identity_token:
-            return Response({'error': 'No identity token provided'}, status=400)
-            
+            return None, "No identity token provided"
+
         header = jwt.get_unverified_header(identity_token)
         kid = header.get('kid')
-        
-        # Get Apple's public keys
-        apple_keys = requests.get('https://appleid.apple.com/auth/keys').json()
-        
-        # Find the matching key
-        public_key_data = next(key for key in apple_keys['keys'] if key['kid'] == kid)
-        public_key = RSAAlgorithm.from_jwk(public_key_data)
-        
+
+        # Find the matching key among Apple's cached public keys
+        public_key = await get_jwks(APPLE_JWKS_URL).get_key(kid)
+        if public_key is None:
+            return None, "Unknown Apple signing key"
+
         # Verify the token
         decoded_token = jwt.decode(
             identity_token,
@@ -141,21 +137,21 @@ def apple_login(identity_token, user_info_raw):
             audience=settings.APPLE_CLIENT_ID,
             issuer='https://appleid.apple.com'
         )
-                
+
         if not decoded_token:
             return None, "Invalid identity token"
-            
+
         email = decoded_token.get('email')
-        
+
         if not email:
             return None, "Email not provided by Apple"
-            
+
         # Try to get name from user_info if provided (first time login)
         name = user_info.get('name', {}).get('firstName', '')
         last_name = user_info.get('name', {}).get('lastName', '')
         full_name = f"{name} {last_name}".strip() if name or last_name else email.split('@')[0]
 
-        user, created = User.objects.get_or_create(
+        user, created = await User.objects.aget_or_create(
             email=email,
             defaults={
                 'name': full_name,
@@ -171,4 +167,3 @@ def apple_login(identity_token, user_info_raw):
 
     except Exception as e:
         return None, str(e)
-
@@ -0,0 +1,126 @@
+import os
+import warnings
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+class InvalidImage(Exception):
+    pass
+
+
+# Originals are re-encoded in the format they came in, anything else as PNG.
+ORIGINAL_FORMATS = {
+    'JPEG': ('jpg', {'quality': 90, 'optimize': True}),
+    'PNG': ('png', {'optimize': True}),
+    'WEBP': ('webp', {'quality': 90}),
+    'GIF': ('gif', {}),
+}
+# The only parts of the original's metadata carried over on re-encode.
+KEPT_INFO = ('icc_profile', 'transparency')
+
+
+def _open(source):
+    """
+    Open `source`, bytes or a binary file, as a checked image. The pixel count
+    comes from the header, so oversized images are refused before anything is
+    decoded, and Pillow's decompression bomb warning is an error here.
+    """
+    fp = BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            fp.seek(0)
+            image = Image.open(fp)
+            if image.width * image.height > settings.IMAGE_MAX_PIXELS:
+                raise InvalidImage(f"Image is larger than {settings.IMAGE_MAX_PIXELS} pixels")
+            image.verify()
+            fp.seek(0)
+            image = Image.open(fp)
+            # Bake the EXIF orientation into the pixels.
+            return ImageOps.exif_transpose(image), image.format
+    except (UnidentifiedImageError, Image.DecompressionBombError, Image.DecompressionBombWarning,
+            OSError, SyntaxError) as e:
+        raise InvalidImage(str(e))
+
+
+def _load(source):
+    image, _ = _open(source)
+    return image.convert('RGB')
+
+
+def normalize_avatar(data):
+    """Validate downloaded bytes as an image and return a resized JPEG."""
+    image = _load(data)
+    size = settings.AVATAR_SIZE
+    image.thumbnail((size, size))
+    output = BytesIO()
+    image.save(output, format='JPEG', quality=85, optimize=True)
+    return output.getvalue()
+
+
+def clean_original(source, name):
+    """
+    Re-encode an uploaded original, bytes or an open binary file, without its
+    EXIF, GPS, XMP and comments, named after the format Pillow detected rather
+    than the extension it came with. Returns a ContentFile.
+    """
+    image, fmt = _open(source)
+    if fmt not in ORIGINAL_FORMATS:
+        fmt = 'PNG'
+    ext, options = ORIGINAL_FORMATS[fmt]
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    elif fmt != 'JPEG' and image.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    image.info = {key: image.info[key] for key in KEPT_INFO if key in image.info}
+
+    output = BytesIO()
+    try:
+        image.save(output, format=fmt, **options)
+    except (OSError, ValueError) as e:
+        raise InvalidImage(str(e))
+    stem = os.path.splitext(os.path.basename(name))[0] or 'image'
+    return ContentFile(output.getvalue(), name=f"{stem}.{ext}")
+
+
+def build_renditions(field_file):
+    """
+    Render `field_file` at every IMAGE_RENDITIONS size as WebP and JPEG and
+    save them next to the original. Returns {size: {format: storage path}}.
+    """
+    with field_file.open('rb') as f:
+        image = _load(f)
+
+    directory, _, file_name = field_file.name.rpartition('/')
+    stem = file_name.rsplit('.', 1)[0]
+    renditions = {}
+    for size_name, size in settings.IMAGE_RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        renditions[size_name] = {}
+        for fmt, ext, options in (('WEBP', 'webp', {'quality': 80, 'method': 4}),
+                                  ('JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True})):
+            output = BytesIO()
+            resized.save(output, format=fmt, **options)
+            path = f"{directory}/renditions/{stem}-{size_name}.{ext}"
+            renditions[size_name][ext] = default_storage.save(path, ContentFile(output.getvalue()))
+    return renditions
+
+
+def delete_renditions(renditions):
+    for formats in renditions.values():
+        for path in formats.values():
+            default_storage.delete(path)
+
+
+def rendition_urls(renditions, request=None):
+    urls = {}
+    for size_name, formats in renditions.items():
+        urls[size_name] = {}
+        for ext, path in formats.items():
+            url = default_storage.url(path)
+            urls[size_name][ext] = request.build_absolute_uri(url) if request else url
+    return urls
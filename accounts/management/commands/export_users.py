@@ -0,0 +1,38 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from accounts.exports import EXPORT_TYPES, UserExportFilter, stream
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = "Stream users as NDJSON or CSV with constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=EXPORT_TYPES, default='ndjson')
+        parser.add_argument('--output', help="File to write, defaults to stdout.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--role')
+        parser.add_argument('--is-active', choices=['true', 'false'])
+        parser.add_argument('--block', choices=['true', 'false'])
+        parser.add_argument('--joined-after', help="ISO 8601 datetime")
+        parser.add_argument('--joined-before', help="ISO 8601 datetime")
+
+    def handle(self, *args, **options):
+        data = {
+            'role': options['role'],
+            'is_active': options['is_active'],
+            'block': options['block'],
+            'date_joined_after': options['joined_after'],
+            'date_joined_before': options['joined_before'],
+        }
+        filterset = UserExportFilter({k: v for k, v in data.items() if v}, queryset=User.objects.all())
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in stream(options['type'], filterset.qs, options['chunk_size']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,252 @@
+import csv
+import gzip
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from django.contrib.auth import hashers
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+from accounts.models import User
+from core.authentication import user_cache
+
+# Columns taken from the input, anything else is ignored.
+IMPORT_FIELDS = ('email', 'uid', 'name', 'bio', 'role', 'is_active', 'is_staff', 'block')
+BOOLEAN_FIELDS = ('is_active', 'is_staff', 'block')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 't')
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def _read_rows(handle, input_type):
+    if input_type == 'csv':
+        yield from csv.DictReader(handle)
+        return
+    for line in handle:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users from a CSV or NDJSON file (optionally gzipped) in batches. "
+        "Rows carry either a plain `password`, hashed on a process pool, or a "
+        "ready `password_hash`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--type', choices=['csv', 'ndjson'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--on-conflict', choices=['skip', 'update'], default='skip',
+            help="What to do with rows whose email or uid already exists.",
+        )
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Hashing processes.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_type = options['type'] or ('csv' if '.csv' in os.path.basename(path) else 'ndjson')
+        batch_size = options['batch_size']
+        self.on_conflict = options['on_conflict']
+        self.verbosity = options['verbosity']
+        self.workers = options['workers']
+        self.counts = {'created': 0, 'updated': 0, 'skipped': 0, 'invalid': 0}
+        self.started = self.reported = time.monotonic()
+
+        try:
+            handle = _open(path)
+        except OSError as exc:
+            raise CommandError(exc)
+
+        # fork rather than forkserver: the children need nothing but the
+        # already configured hashers.
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('fork'),
+        )
+        try:
+            with handle:
+                rows = _read_rows(handle, input_type)
+                pending = None
+                # Hash batch n+1 on the pool while batch n is written, with at
+                # most two batches in memory.
+                while True:
+                    batch = self.prepare(list(islice(rows, batch_size)), pool)
+                    if pending is not None:
+                        self.write(*pending)
+                    if batch is None:
+                        break
+                    pending = batch
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+        elapsed = time.monotonic() - self.started
+        processed = sum(self.counts.values())
+        rate = processed / elapsed if elapsed else processed
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} rows ({self.counts['created']} created, {self.counts['updated']} updated, "
+            f"{self.counts['skipped']} skipped, {self.counts['invalid']} invalid) "
+            f"in {elapsed:.2f}s, {rate:.0f} rows/s"
+        ))
+
+    def prepare(self, raw_rows, pool):
+        if not raw_rows:
+            return None
+
+        rows, seen = [], set()
+        for raw in raw_rows:
+            row = self.clean(raw)
+            if row is None:
+                self.counts['invalid'] += 1
+                continue
+            # Later duplicates of an email or uid within a batch lose.
+            keys = {('email', row['email'])}
+            if row.get('uid'):
+                keys.add(('uid', row['uid']))
+            if keys & seen:
+                self.counts['skipped'] += 1
+            else:
+                seen |= keys
+                rows.append(row)
+
+        plain = []
+        for row in rows:
+            if 'password' in row:
+                plain.append(row.pop('password'))
+                row['_hashed'] = True
+        # map() submits every job now and yields results in input order.
+        chunksize = max(1, len(plain) // (self.workers * 4))
+        return rows, pool.map(hashers.make_password, plain, chunksize=chunksize)
+
+    def clean(self, raw):
+        email = raw.get('email')
+        email = email.strip() if isinstance(email, str) else ''
+        try:
+            validate_email(email)
+        except ValidationError:
+            return None
+        row = {'email': User.objects.normalize_email(email)}
+        for field in IMPORT_FIELDS[1:]:
+            value = raw.get(field)
+            if value is None or value == '':
+                continue
+            if field in BOOLEAN_FIELDS and isinstance(value, str):
+                value = value.strip().lower() in TRUE_VALUES
+            row[field] = value
+
+        if row.get('role', 'user') not in dict(User.ROLE):
+            return None
+
+        # Pre-hashed values must be in the format User.save() leaves alone.
+        password_hash = raw.get('password_hash')
+        if password_hash:
+            if not password_hash.startswith(('pbkdf2_sha256$', UNUSABLE_PASSWORD_PREFIX)):
+                return None
+            row['password_hash'] = password_hash
+        elif raw.get('password'):
+            row['password'] = raw['password']
+        return row
+
+    def write(self, rows, hashed):
+        for row in rows:
+            if row.pop('_hashed', False):
+                row['password'] = next(hashed)
+            elif 'password_hash' in row:
+                row['password'] = row.pop('password_hash')
+
+        existing = self.existing(rows)
+        new, updates = [], []
+        for row in rows:
+            match = existing['email'].get(row['email']) or existing['uid'].get(row.get('uid'))
+            if match is None:
+                new.append(row)
+            elif self.on_conflict == 'update' and self._same_user(row, match, existing):
+                updates.append((row, match))
+            else:
+                self.counts['skipped'] += 1
+
+        with transaction.atomic():
+            if new:
+                users = [self.build(row) for row in new]
+                # Rows racing in from elsewhere are dropped, not fatal. The
+                # ids are set here, so the ones that made it can be counted.
+                User.objects.bulk_create(users, ignore_conflicts=True)
+                created = User.objects.using('default').filter(pk__in=[user.pk for user in users]).count()
+                self.counts['created'] += created
+                self.counts['skipped'] += len(users) - created
+            updated = self.update(updates)
+
+        for pk in updated:
+            user_cache.invalidate(pk)
+        self.report()
+
+    def existing(self, rows):
+        emails = [row['email'] for row in rows]
+        uids = [row['uid'] for row in rows if row.get('uid')]
+        condition = Q(email__in=emails)
+        if uids:
+            condition |= Q(uid__in=uids)
+        existing = {'email': {}, 'uid': {}}
+        columns = ('pk', 'email', 'uid', *User.AUTH_FIELDS, 'auth_version')
+        for values in User.objects.using('default').filter(condition).values(*columns):
+            existing['email'][values['email']] = values
+            if values['uid']:
+                existing['uid'][values['uid']] = values
+        return existing
+
+    def _same_user(self, row, match, existing):
+        # An email owned by one user and a uid owned by another can't be
+        # merged into a single row.
+        by_email = existing['email'].get(row['email'])
+        by_uid = existing['uid'].get(row.get('uid'))
+        return not (by_email and by_uid and by_email['pk'] != by_uid['pk'])
+
+    def build(self, row):
+        user = User(**{field: value for field, value in row.items() if field != 'password'})
+        user.password = row.get('password') or hashers.make_password(None)
+        return user
+
+    def update(self, updates):
+        # Group by the set of columns supplied so one upsert per group never
+        # overwrites a column a row didn't carry.
+        groups = {}
+        for row, match in updates:
+            fields = tuple(sorted(field for field in row if field != 'email'))
+            user = User(pk=match['pk'], email=row['email'], **{field: row[field] for field in fields})
+            user.auth_version = match['auth_version']
+            if any(field in fields and row[field] != match[field] for field in User.AUTH_FIELDS):
+                user.auth_version += 1
+            groups.setdefault(fields, []).append(user)
+
+        updated = []
+        for fields, users in groups.items():
+            User.objects.bulk_create(
+                users,
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=[*fields, 'auth_version', 'updated_at'],
+            )
+            updated.extend(user.pk for user in users)
+        self.counts['updated'] += len(updated)
+        return updated
+
+    def report(self):
+        now = time.monotonic()
+        if self.verbosity < 2 and now - self.reported < 5:
+            return
+        self.reported = now
+        processed = sum(self.counts.values())
+        elapsed = now - self.started
+        self.stdout.write(f"  {processed} rows, {processed / elapsed if elapsed else processed:.0f} rows/s")
@@ -0,0 +1,54 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from accounts.models import OTP
+
+
+class Command(BaseCommand):
+    help = "Delete expired and superseded OTP rows in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help="Seconds to pause between batches to give writers room.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pause = options['sleep']
+        self.verbosity = options['verbosity']
+        started = time.monotonic()
+
+        cutoff = timezone.now() - timedelta(seconds=settings.OTP_TTL)
+        expired = self.purge(OTP.objects.filter(created_at__lt=cutoff), batch_size, pause)
+
+        # Only the latest code per user can be verified, older ones are dead.
+        newer = OTP.objects.filter(user=OuterRef('user'), created_at__gt=OuterRef('created_at'))
+        superseded = self.purge(OTP.objects.filter(Exists(newer)), batch_size, pause)
+
+        elapsed = time.monotonic() - started
+        deleted = expired + superseded
+        rate = deleted / elapsed if elapsed else deleted
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} OTP rows ({expired} expired, {superseded} superseded) "
+            f"in {elapsed:.2f}s, {rate:.0f} rows/s"
+        ))
+
+    def purge(self, queryset, batch_size, pause):
+        total = 0
+        while True:
+            # Select a bounded set of keys first so each DELETE stays small
+            # and only holds its locks briefly.
+            pks = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return total
+            deleted, _ = OTP.objects.filter(pk__in=pks).delete()
+            total += deleted
+            if self.verbosity > 1:
+                self.stdout.write(f"  deleted {total} rows")
+            if pause:
+                time.sleep(pause)
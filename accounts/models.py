@@ -1,9 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser, PermissionsMixin
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
 from django.conf import settings
-import random,uuid
+import random,uuid,math,os
 from django.utils import timezone
 from datetime import timedelta
+from core import hashing
+from core.utils import uuid7
+from .images import clean_original
 
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -12,7 +16,7 @@ class UserManager(BaseUserManager):
 
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
-        user.set_password(password)
+        user.password = hashing.make_password(password, 'signup')
         user.save(using=self._db)
         return user
 
@@ -32,40 +36,94 @@ class UserManager(BaseUserManager):
 class User(AbstractBaseUser, PermissionsMixin):
     ROLE = (('user', 'User'),('admin', 'Admin'),)
     
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     uid = models.CharField(max_length=255,unique=True,verbose_name="User UID",null=True,blank=True)
     email = models.EmailField(max_length=255,unique=True,verbose_name="User Email")
     name = models.CharField(max_length=200, blank=True, null=True,verbose_name="User Name")
     bio = models.TextField(blank=True, null=True,verbose_name="User Bio")
     cover = models.ImageField(upload_to='cover_images/', blank=True, null=True,)
     image = models.ImageField(upload_to='profile_images/', blank=True, null=True,)
+    cover_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     role = models.CharField(max_length=10, choices=ROLE, default='user',verbose_name="User Role")
     is_active = models.BooleanField(default=False,verbose_name="Active User")
     is_staff = models.BooleanField(default=False,verbose_name="Staff User")
     is_superuser = models.BooleanField(default=False,verbose_name="Super User")
     date_joined = models.DateTimeField(auto_now_add=True, verbose_name="Joining Date")
     block = models.BooleanField(default=False,verbose_name="Suspend User")
+    auth_version = models.PositiveIntegerField(default=0, editable=False, verbose_name="Auth Version")
+    # Bumped by every save(), the profile endpoints' ETag/Last-Modified.
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Last Updated")
 
     objects = UserManager()
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
         ordering = ['-date_joined']
+        indexes = [
+            # Admin changelist ordering and its keyset paging.
+            models.Index(fields=['-date_joined', '-id'], name='user_date_joined_idx'),
+        ]
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
+    # Changing any of these invalidates the user's issued tokens.
+    AUTH_FIELDS = ('role', 'block', 'is_active', 'password')
+    # Renditions are rebuilt in the background when one of these changes.
+    MEDIA_FIELDS = ('image', 'cover')
 
     def __str__(self):
         return self.email
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_auth_state = instance._auth_state()
+        instance._loaded_media = instance._media_state()
+        return instance
+
+    def _auth_state(self):
+        # A field deferred at load and still deferred is unchanged, one that
+        # has been loaded or assigned since counts as changed.
+        return tuple(self.__dict__.get(field, models.DEFERRED) for field in self.AUTH_FIELDS)
+
+    def _media_state(self):
+        return {
+            field: getattr(self.__dict__.get(field), 'name', self.__dict__.get(field)) or ''
+            for field in self.MEDIA_FIELDS
+        }
         
     def save(self, *args, **kwargs):
-        if self.password and not self.password.startswith('pbkdf2_sha256$'):
-            self.set_password(self.password)
+        # Read through __dict__ so a deferred password isn't loaded just to
+        # be checked.
+        password = self.__dict__.get('password')
+        if password and not password.startswith(('pbkdf2_sha256$', UNUSABLE_PASSWORD_PREFIX)):
+            self.password = hashing.make_password(password)
 
         if self.is_staff and self.is_superuser:
             self.role = 'admin'
 
+        for field in self.MEDIA_FIELDS:
+            if field not in self.__dict__:
+                continue
+            file = getattr(self, field)
+            # A new upload, not in storage yet: it is stored without its
+            # metadata and under the extension of its actual format.
+            if file and not file._committed:
+                file.open('rb')
+                setattr(self, field, clean_original(file, file.name))
+
+        loaded = getattr(self, '_loaded_auth_state', None)
+        if loaded is not None and loaded != self._auth_state():
+            self.auth_version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'auth_version'}
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
+
         super().save(*args, **kwargs)
+        self._loaded_auth_state = self._auth_state()
+        self._loaded_media = self._media_state()
 
     @property
     def is_user(self):
@@ -87,6 +145,13 @@ class OTP(models.Model):
     attempt_count = models.IntegerField(default=0)  
     last_tried = models.DateTimeField(null=True, blank=True)  
 
+    class Meta:
+        indexes = [
+            # verify_otp's latest('created_at') per user, and the purge scan.
+            models.Index(fields=['user', '-created_at'], name='otp_user_created_idx'),
+            models.Index(fields=['created_at'], name='otp_created_idx'),
+        ]
+
     def __str__(self):
         return f"OTP for: {self.user}."
 
@@ -96,6 +161,45 @@ class OTP(models.Model):
         return OTP.objects.create(user=user, otp=otp_code)
 
     def is_expired(self):
-        return self.created_at + timedelta(minutes=3) < timezone.now()
+        return self.created_at + timedelta(seconds=settings.OTP_TTL) < timezone.now()
+
+
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=255, unique=True, verbose_name="Token ID")
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Revoked token: {self.jti}."
+
+
+class UploadSession(models.Model):
+    FIELD = (('image', 'Profile Image'), ('cover', 'Cover Image'),)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='upload_sessions', on_delete=models.CASCADE)
+    field = models.CharField(max_length=10, choices=FIELD)
+    file_name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    received = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Upload {self.id} for: {self.user}."
+
+    @property
+    def chunk_count(self):
+        return max(1, math.ceil(self.size / self.chunk_size))
+
+    @property
+    def path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{self.id}.part")
 
+    def chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
 
+    def delete(self, *args, **kwargs):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        return super().delete(*args, **kwargs)
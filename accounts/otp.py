@@ -0,0 +1,105 @@
+import random
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import OTP
+
+
+class BaseOTPStore:
+    """
+    Issues and checks OTP codes keyed by email. verify() returns the same
+    {"status", "log"} dict as the helpers, and counts every try against
+    OTP_MAX_ATTEMPTS before comparing codes so parallel guesses can't slip
+    past the limit.
+    """
+
+    def __init__(self):
+        self.ttl = getattr(settings, 'OTP_TTL', 180)
+        self.max_attempts = getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+
+    def issue(self, user):
+        raise NotImplementedError
+
+    def verify(self, email, otp_code):
+        raise NotImplementedError
+
+    def too_many_attempts(self):
+        return {"status": False, "log": "Too many attempts. Please request a new OTP."}
+
+
+class ModelOTPStore(BaseOTPStore):
+
+    def issue(self, user):
+        return OTP.generate_otp(user).otp
+
+    def verify(self, email, otp_code):
+        try:
+            # Codes are read right after they are issued, a replica may not
+            # have them yet.
+            otp_obj = OTP.objects.using('default').filter(user__email=email).latest('created_at')
+        except OTP.DoesNotExist:
+            return {"status": False, "log": "Invalid OTP or email."}
+
+        if otp_obj.is_expired():
+            return {"status": False, "log": "OTP has expired."}
+
+        tried = OTP.objects.filter(pk=otp_obj.pk, attempt_count__lt=self.max_attempts).update(
+            attempt_count=F('attempt_count') + 1,
+            last_tried=timezone.now(),
+        )
+        if not tried:
+            return self.too_many_attempts()
+
+        if otp_obj.otp != otp_code:
+            return {"status": False, "log": "Invalid OTP."}
+
+        otp_obj.delete()
+        return {"status": True, "log": "OTP verified statusfully."}
+
+
+class CacheOTPStore(BaseOTPStore):
+    """
+    Keeps one code per email in the cache with a native TTL, so nothing has
+    to be cleaned up and a lookup is a single key read.
+    """
+
+    def _keys(self, email):
+        key = f"otp:{email}"
+        return key, f"{key}:attempt_count", f"{key}:last_tried"
+
+    def issue(self, user):
+        code_key, attempts_key, last_tried_key = self._keys(user.email)
+        otp_code = str(random.randint(1000, 9999))
+        # A new code replaces the old one and resets its attempts.
+        cache.set_many({code_key: otp_code, attempts_key: 0}, self.ttl)
+        cache.delete(last_tried_key)
+        return otp_code
+
+    def verify(self, email, otp_code):
+        code_key, attempts_key, last_tried_key = self._keys(email)
+        try:
+            attempt_count = cache.incr(attempts_key)
+        except ValueError:
+            return {"status": False, "log": "Invalid or expired OTP."}
+
+        if attempt_count > self.max_attempts:
+            return self.too_many_attempts()
+
+        stored = cache.get(code_key)
+        if stored is None:
+            return {"status": False, "log": "Invalid or expired OTP."}
+
+        if stored != otp_code:
+            cache.set(last_tried_key, timezone.now(), self.ttl)
+            return {"status": False, "log": "Invalid OTP."}
+
+        cache.delete_many([code_key, attempts_key, last_tried_key])
+        return {"status": True, "log": "OTP verified statusfully."}
+
+
+@lru_cache(maxsize=None)
+def get_otp_store():
+    return import_string(getattr(settings, 'OTP_STORE', 'accounts.otp.ModelOTPStore'))()
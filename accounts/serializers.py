@@ -1,4 +1,7 @@
 from .models import User
+from core import hashing
+from core.serializers import CompiledRepresentation
+from .images import InvalidImage, rendition_urls
 from rest_framework import serializers
 
 
@@ -35,9 +38,10 @@ class SignInSerializer(serializers.Serializer):
         password = attrs.get('password')
         
         if email and password:
-            user = User.objects.filter(email=email).first()
+            # From the primary, a password reset just before must be seen.
+            user = User.objects.using('default').filter(email=email).first()
             if user:
-                if not user.check_password(password):
+                if not hashing.check_password(password, user.password, 'signin', self.rehash_setter(user)):
                      raise serializers.ValidationError("Invalid credentials")
                 if not user.is_active:
                     raise serializers.ValidationError("User is not active")
@@ -49,23 +53,52 @@ class SignInSerializer(serializers.Serializer):
                 raise serializers.ValidationError("User not found")
         raise serializers.ValidationError("Email and password are required")
 
+    def rehash_setter(self, user):
+        def setter(raw_password):
+            try:
+                encoded = hashing.make_password(raw_password, 'signin')
+            except hashing.HashingBusy:
+                # Not worth failing the sign-in over, the next one retries.
+                return
+            # An update rather than save(): a rehash is no password change
+            # and must not bump auth_version, which would revoke the user's
+            # tokens. Skipped if the password changed meanwhile.
+            User.objects.filter(pk=user.pk, password=user.password).update(password=encoded)
+            user.password = encoded
+        return setter
+
 
 class UserProfileSerializer(serializers.ModelSerializer):
-    
+    image_renditions = serializers.SerializerMethodField()
+    cover_renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        exclude = ['block', 'is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions', 'date_joined']
+        exclude = ['block', 'is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions', 'date_joined', 'auth_version', 'updated_at']
         read_only_fields = ['id', 'email', 'role']
         extra_kwargs = {'password': {'write_only': True}}
 
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj.image_renditions, self.context.get('request'))
+
+    def get_cover_renditions(self, obj):
+        return rendition_urls(obj.cover_renditions, self.context.get('request'))
+
     def update(self, instance, validated_data):
         instance.name = validated_data.get('name', instance.name)
         instance.image = validated_data.get('image', instance.image)
 
         if validated_data.get('password'):
-            if not instance.check_password(validated_data['old_password']):
+            if not hashing.check_password(validated_data['old_password'], instance.password, 'profile'):
                 raise serializers.ValidationError("Old password does not match.")
-            instance.set_password(validated_data['password'])
+            instance.password = hashing.make_password(validated_data['password'], 'profile')
 
-        instance.save()
+        try:
+            instance.save()
+        except InvalidImage:
+            raise serializers.ValidationError({'image': "Not a valid image."})
         return instance
+
+
+# Profile payload returned by every auth endpoint, compiled on first use.
+profile_representation = CompiledRepresentation(UserProfileSerializer)
@@ -0,0 +1,24 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core.authentication import user_cache
+from .models import User
+from .tasks import process_user_media
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(sender, instance, using=None, **kwargs):
+    user_cache.invalidate(instance.pk)
+    # A worker reading the row before the commit would cache the old values
+    # under the new version stamp, so stamp it again once they are visible.
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(partial(user_cache.invalidate, instance.pk), using=using)
+
+
+@receiver(post_save, sender=User)
+def queue_media_renditions(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_media', {})
+    for field, name in instance._media_state().items():
+        if name != loaded.get(field, ''):
+            transaction.on_commit(partial(process_user_media.delay, str(instance.pk), field, name))
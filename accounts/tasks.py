@@ -0,0 +1,139 @@
+import httpx
+from datetime import timedelta
+from smtplib import SMTPException
+from celery import shared_task
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db.models import Q
+from django.core.mail import send_mail
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import slugify
+from core.authentication import user_cache
+from core.http import get_client
+from .images import normalize_avatar, build_renditions, delete_renditions, InvalidImage
+from .models import RevokedToken, UploadSession, User
+
+
+# The OTP is only valid for 3 minutes, so retries back off quickly and give up
+# well before the code expires.
+@shared_task(
+    autoretry_for=(SMTPException, OSError),
+    retry_backoff=2,
+    retry_backoff_max=30,
+    retry_jitter=True,
+    max_retries=5,
+)
+def send_otp_email(email, otp, task="verification"):
+    subject = f"Your OTP for {task}"
+    message = f"Your OTP code is {otp}. It will expire in {settings.OTP_TTL // 60} minutes."
+    send_mail(subject, message, settings.EMAIL_HOST_USER, [email])
+
+
+@shared_task
+def purge_otps():
+    call_command('purge_otps')
+
+
+@shared_task
+def purge_revoked_tokens():
+    # Expired tokens fail validation anyway, their revocation rows are dead.
+    RevokedToken.objects.filter(expires_at__lt=timezone.now()).delete()
+
+
+@shared_task
+def purge_upload_sessions():
+    # Abandoned chunked uploads, delete() also removes the part file.
+    cutoff = timezone.now() - timedelta(days=1)
+    for upload in UploadSession.objects.filter(created_at__lt=cutoff).iterator():
+        upload.delete()
+
+
+def _acquire_download_slot():
+    # Cache keys as a semaphore shared by every worker, the timeout frees a
+    # slot if its holder dies.
+    for slot in range(settings.AVATAR_MAX_CONCURRENT_DOWNLOADS):
+        key = f"avatar:slot:{slot}"
+        if cache.add(key, 1, 60):
+            return key
+    return None
+
+
+def _download(url):
+    with get_client().stream("GET", url) as response:
+        response.raise_for_status()
+        if not response.headers.get("content-type", "").startswith("image/"):
+            raise InvalidImage("Not an image")
+        data = bytearray()
+        for chunk in response.iter_bytes():
+            data.extend(chunk)
+            if len(data) > settings.AVATAR_MAX_BYTES:
+                raise InvalidImage("Image too large")
+    return bytes(data)
+
+
+@shared_task(bind=True, autoretry_for=(httpx.TransportError,), retry_backoff=5, max_retries=3)
+def fetch_avatar(self, user_id, url):
+    # Only one fetch per user at a time, duplicates are dropped.
+    lock_key = f"avatar:user:{user_id}"
+    if not cache.add(lock_key, url, 120):
+        return
+
+    try:
+        slot = _acquire_download_slot()
+        if slot is None:
+            raise self.retry(countdown=5, max_retries=10)
+        try:
+            data = _download(url)
+        finally:
+            cache.delete(slot)
+
+        try:
+            content = normalize_avatar(data)
+        except InvalidImage:
+            return
+
+        user = User.objects.filter(pk=user_id).first()
+        # Never overwrite a picture the user has set meanwhile.
+        if user is None or user.image:
+            return
+        file_name = f"{slugify(user.name or user.email.split('@')[0])}-profile.jpg"
+        # Stored first, then attached with a conditional update(): save()
+        # would write back every column read above over a profile edit made
+        # since, and a picture set in the meantime still wins.
+        user.image.save(file_name, ContentFile(content), save=False)
+        attached = User.objects.filter(Q(image='') | Q(image__isnull=True), pk=user_id).update(
+            image=user.image.name, updated_at=timezone.now(),
+        )
+        if not attached:
+            user.image.delete(save=False)
+            return
+        user_cache.invalidate(user_id)
+        process_user_media.delay(str(user_id), 'image', user.image.name)
+    except (httpx.HTTPStatusError, InvalidImage):
+        return
+    finally:
+        cache.delete(lock_key)
+
+
+@shared_task
+def process_user_media(user_id, field, name):
+    user = User.objects.filter(pk=user_id).first()
+    # Skip if the user is gone or has uploaded something newer since.
+    if user is None or (getattr(user, field).name or '') != name:
+        return
+
+    renditions_field = f"{field}_renditions"
+    old = getattr(user, renditions_field)
+    renditions = {}
+    if name:
+        try:
+            renditions = build_renditions(getattr(user, field))
+        except InvalidImage:
+            pass
+
+    # update() rather than save() so this doesn't queue itself again.
+    User.objects.filter(pk=user_id).update(**{renditions_field: renditions}, updated_at=timezone.now())
+    user_cache.invalidate(user_id)
+    delete_renditions(old)
@@ -1,3 +1,684 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO, StringIO
+from smtplib import SMTPServerDisconnected
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import send_mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from core import celery_app, hashing
+from core.http import LIMITS, get_async_client
+from core.routers import _pinned
+from core.throttling import SlidingWindowThrottle
+from core.tokens import UserRefreshToken
+from core.tests import LocalHTTPMixin
+from PIL import Image
+from . import exports, helper
+from .images import InvalidImage, normalize_avatar
+from .management.commands.import_users import Command as ImportUsersCommand
+from .models import OTP, UploadSession, User
+from .otp import CacheOTPStore, ModelOTPStore, get_otp_store
+from .tasks import fetch_avatar, send_otp_email
+from .serializers import SignInSerializer, UserProfileSerializer, profile_representation
+from .views import ExportUsersView
 
-# Create your tests here.
+
+def make_user(email, **fields):
+    # An unusable password keeps the hashing pool out of test setup.
+    fields.setdefault('password', '!')
+    return User.objects.create(email=email, **fields)
+
+
+def photo(size=(40, 20), fmt='JPEG'):
+    """An image tagged with a GPS position, a comment and a 90° rotation."""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif.get_ifd(0x8825).update({1: 'N', 2: (52.0, 22.0, 1.0)})
+    output = BytesIO()
+    Image.new('RGB', size, 'red').save(output, fmt, exif=exif, comment=b'home')
+    return output.getvalue()
+
+
+class MediaRootMixin:
+    """Stores media and chunked uploads in a temporary directory."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, CHUNKED_UPLOAD_DIR=os.path.join(media_root, 'uploads_tmp'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class EagerCeleryMixin:
+    """Runs tasks inline, errors are kept on the result rather than raised."""
+
+    def setUp(self):
+        super().setUp()
+        # The app reads its settings once, so override_settings can't switch
+        # it to eager. Propagating errors would also skip the eager retries.
+        for name, value in (('CELERY_TASK_ALWAYS_EAGER', True), ('CELERY_TASK_EAGER_PROPAGATES', False)):
+            self.addCleanup(celery_app.conf.__setitem__, name, celery_app.conf[name])
+            celery_app.conf[name] = value
+
+
+class PurgeOtpsTests(TestCase):
+
+    def setUp(self):
+        self.alice = make_user('alice@example.com')
+        self.bob = make_user('bob@example.com')
+
+    def otp(self, user, age):
+        otp = OTP.objects.create(user=user, otp='1234')
+        OTP.objects.filter(pk=otp.pk).update(created_at=timezone.now() - age)
+        return otp
+
+    def test_deletes_expired_and_superseded_rows(self):
+        ttl = timedelta(seconds=settings.OTP_TTL)
+        self.otp(self.alice, ttl + timedelta(minutes=5))
+        self.otp(self.bob, timedelta(seconds=30))
+        latest = self.otp(self.bob, timedelta(seconds=5))
+
+        out = StringIO()
+        call_command('purge_otps', batch_size=1, stdout=out)
+
+        self.assertEqual(list(OTP.objects.values_list('pk', flat=True)), [latest.pk])
+        self.assertIn("Deleted 2 OTP rows (1 expired, 1 superseded)", out.getvalue())
+
+    def test_keeps_the_latest_unexpired_code_per_user(self):
+        kept = {self.otp(self.alice, timedelta(seconds=10)).pk, self.otp(self.bob, timedelta(seconds=10)).pk}
+
+        call_command('purge_otps', stdout=StringIO())
+
+        self.assertEqual(set(OTP.objects.values_list('pk', flat=True)), kept)
+
+
+class OtpIndexTests(TestCase):
+    """
+    verify's latest-code lookup must be an index seek, so its latency stays
+    flat as the table grows (benchmarks/otp_verify.py measures it at 1M rows).
+    """
+
+    def test_latest_lookup_uses_user_created_index(self):
+        user = make_user('alice@example.com')
+        plan = OTP.objects.filter(user__email=user.email).order_by('-created_at')[:1].explain()
+        self.assertIn('otp_user_created_idx', plan)
+
+    def test_purge_scan_uses_created_index(self):
+        plan = OTP.objects.filter(created_at__lt=timezone.now()).values('pk')[:1000].explain()
+        self.assertIn('otp_created_idx', plan)
+
+
+class GoogleLoginTests(LocalHTTPMixin, TestCase):
+    """google_login against a local stand-in for Google's token endpoints."""
+
+    def setUp(self):
+        super().setUp()
+        self.http.delay = 0.1
+        self.http.routes = {'/tokeninfo': self.tokeninfo, '/userinfo': self.userinfo}
+        patcher = mock.patch.multiple(
+            helper, GOOGLE_TOKENINFO_URL=self.url('/tokeninfo'), GOOGLE_USERINFO_URL=self.url('/userinfo'),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tokeninfo(self, query, headers):
+        token = query['access_token'][0]
+        return (200, {}, {'sub': token}) if token.startswith('good') else (400, {}, {'error': 'invalid_token'})
+
+    def userinfo(self, query, headers):
+        token = headers['Authorization'].removeprefix('Bearer ')
+        return 200, {}, {'email': f'{token}@example.com', 'name': token}
+
+    async def login(self, *tokens):
+        return await asyncio.gather(*(helper.google_login(token) for token in tokens))
+
+    async def test_concurrent_logins_share_pooled_connections(self):
+        tokens = [f'good-{index}' for index in range(LIMITS.max_keepalive_connections // 2)]
+        try:
+            first = await self.login(*tokens)
+            opened = len(self.connections)
+            second = await self.login(*tokens)
+        finally:
+            await get_async_client().aclose()
+
+        self.assertEqual([error for _, error in first + second], [None] * len(tokens) * 2)
+        self.assertEqual([user.email for user, _ in first], [f'{token}@example.com' for token in tokens])
+        self.assertEqual([user.pk for user, _ in second], [user.pk for user, _ in first])
+        # Both provider calls of every login were in flight together.
+        self.assertEqual(self.http.peak, len(tokens) * 2)
+        self.assertEqual(len(self.requests_to('/tokeninfo')), len(tokens) * 2)
+        # The second round ran over the kept-alive connections of the first.
+        self.assertLessEqual(opened, len(tokens) * 2)
+        self.assertEqual(len(self.connections), opened)
+
+    async def test_rejected_token_creates_no_user(self):
+        try:
+            (result,) = await self.login('bad-token')
+        finally:
+            await get_async_client().aclose()
+
+        self.assertEqual(result, (None, 'Invalid access token'))
+        self.assertFalse(await User.objects.filter(email='bad-token@example.com').aexists())
+
+
+class OriginalMediaTests(MediaRootMixin, TestCase):
+
+    def test_new_upload_is_stored_without_metadata(self):
+        user = make_user('alice@example.com')
+        user.image = SimpleUploadedFile('photo.jpeg', photo(), content_type='image/jpeg')
+        user.save()
+
+        self.assertRegex(user.image.name, r'^profile_images/photo.*\.jpg$')
+        with Image.open(user.image.path) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            # The rotation is baked in, the GPS position and comment are gone.
+            self.assertEqual(stored.size, (20, 40))
+            self.assertEqual(dict(stored.getexif()), {})
+            self.assertNotIn('comment', stored.info)
+
+    def test_stored_files_are_not_reencoded_on_save(self):
+        user = make_user('alice@example.com')
+        user.image = SimpleUploadedFile('photo.png', photo(fmt='PNG'), content_type='image/png')
+        user.save()
+        name, modified = user.image.name, user.image.storage.get_modified_time(user.image.name)
+
+        user.name = 'Alice'
+        user.save()
+        self.assertEqual(user.image.name, name)
+        self.assertEqual(user.image.storage.get_modified_time(name), modified)
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_oversized_images_are_refused_before_decoding(self):
+        data = photo((40, 20), fmt='PNG')
+        with mock.patch('PIL.ImageFile.ImageFile.load') as load, self.assertRaises(InvalidImage):
+            normalize_avatar(data)
+        load.assert_not_called()
+
+    def test_decompression_bombs_are_refused(self):
+        # Over MAX_IMAGE_PIXELS Pillow warns, over twice that it raises.
+        for limit in (600, 300):
+            with self.subTest(limit=limit), mock.patch.object(Image, 'MAX_IMAGE_PIXELS', limit):
+                with self.assertRaises(InvalidImage):
+                    normalize_avatar(photo((40, 20)))
+
+    def test_normalize_avatar_drops_metadata(self):
+        with Image.open(BytesIO(normalize_avatar(photo(fmt='PNG')))) as avatar:
+            self.assertEqual(avatar.format, 'JPEG')
+            self.assertEqual(avatar.size, (20, 40))
+            self.assertEqual(dict(avatar.getexif()), {})
+
+
+class ChunkedUploadTests(MediaRootMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('alice@example.com', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, file_name, data):
+        return self.client.post(
+            reverse('upload_init'), {'field': 'image', 'file_name': file_name, 'size': len(data)}, format='json',
+        )
+
+    def upload(self, file_name, data):
+        upload_id = self.start(file_name, data).data['log']['upload_id']
+        response = self.client.put(
+            reverse('upload_chunk', args=[upload_id, 0]), data, content_type='application/octet-stream',
+        )
+        self.assertEqual(response.status_code, 200)
+        return reverse('upload_finalize', args=[upload_id])
+
+    def test_file_names_that_cannot_be_images_are_refused(self):
+        response = self.start('profile.html', photo())
+        self.assertEqual(response.status_code, 400)
+
+    def test_stored_extension_follows_the_detected_format(self):
+        # A polyglot that passes as PNG by name but is a JPEG.
+        response = self.client.post(self.upload('profile.png', photo()))
+        self.assertEqual(response.status_code, 200)
+
+        self.user.refresh_from_db()
+        self.assertRegex(self.user.image.name, r'^profile_images/profile.*\.jpg$')
+
+    def test_invalid_image_is_refused_and_discarded(self):
+        finalize = self.upload('profile.png', b'<html><script>alert(1)</script></html>')
+        response = self.client.post(finalize)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(finalize).status_code, 404)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.image)
+
+    def test_finalize_encodes_the_upload_once(self):
+        finalize = self.upload('profile.png', photo(fmt='PNG'))
+        with mock.patch('accounts.models.clean_original') as reencoded:
+            response = self.client.post(finalize)
+
+        self.assertEqual(response.status_code, 200)
+        reencoded.assert_not_called()
+        self.user.refresh_from_db()
+        self.assertRegex(self.user.image.name, r'^profile_images/profile.*\.png$')
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_repeated_finalize_finds_the_session_gone(self):
+        finalize = self.upload('profile.jpg', photo())
+        self.assertEqual(self.client.post(finalize).status_code, 200)
+        self.assertEqual(self.client.post(finalize).status_code, 404)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class PrimaryReadTests(TestCase):
+    """
+    The OTP and sign-in flows follow a sign-up or reset with no token to pin
+    on, so they must read from the primary. 'replica' is not a configured
+    database here, any read routed to it fails.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('alice@example.com', is_active=True, password=make_password('secret'))
+        # The writes above pinned this context to the primary.
+        self.addCleanup(_pinned.reset, _pinned.set(False))
+
+    def test_sign_in_reads_from_primary(self):
+        serializer = SignInSerializer(data={'email': 'alice@example.com', 'password': 'secret'})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['user'], self.user)
+
+    async def test_send_otp_reads_from_primary(self):
+        with mock.patch.object(helper.send_otp_email, 'delay') as delay:
+            result = await helper.send_otp('alice@example.com')
+        self.assertTrue(result['status'], result['log'])
+        delay.assert_called_once()
+
+    async def test_verify_otp_reads_from_primary(self):
+        code = await sync_to_async(get_otp_store().issue)(self.user)
+        _pinned.set(False)
+        result = await helper.verify_otp('alice@example.com', code)
+        self.assertTrue(result['status'], result['log'])
+
+
+class ExportUsersTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('admin@example.com', is_active=True, is_staff=True)
+        for index in range(9):
+            make_user(f'user{index}@example.com')
+
+    async def export(self, **params):
+        request = APIRequestFactory().get('/auth/users/export/', params)
+        force_authenticate(request, user=self.admin)
+        return await ExportUsersView.as_view()(request)
+
+    async def test_rows_are_read_as_the_response_is_consumed(self):
+        formatted = []
+        line = exports._ndjson_lines()[1]
+        # One piece per row, and a record of which rows were read so far.
+        recording = (lambda: ([], lambda row: formatted.append(row) or line(row)), 'application/x-ndjson')
+        with mock.patch.object(exports, 'BUFFER_SIZE', 1), mock.patch.dict(exports.EXPORT_TYPES, ndjson=recording):
+            response = await self.export(type='ndjson')
+            self.assertTrue(response.is_async)
+            pieces = aiter(response.streaming_content)
+            first = await anext(pieces)
+            self.assertEqual(len(formatted), 1)
+            rest = [piece async for piece in pieces]
+
+        self.assertEqual(len(formatted), 10)
+        self.assertEqual(len([first, *rest]), 10)
+        self.assertIn(b'"email"', first)
+
+    async def test_csv_has_a_header(self):
+        response = await self.export(type='csv', role='user')
+        body = b''.join([piece async for piece in response.streaming_content]).decode()
+        lines = body.splitlines()
+        self.assertEqual(lines[0], ','.join(exports.EXPORT_FIELDS))
+        self.assertEqual(len(lines), 11)
+
+
+class ImportUsersTests(MediaRootMixin, TestCase):
+
+    def run_import(self, rows):
+        path = os.path.join(settings.MEDIA_ROOT, 'users.ndjson')
+        with open(path, 'w') as f:
+            f.writelines(json.dumps(row) + '\n' for row in rows)
+        out = StringIO()
+        call_command('import_users', path, workers=1, stdout=out)
+        return out.getvalue()
+
+    def test_malformed_emails_are_invalid(self):
+        out = self.run_import([
+            {'email': 'alice@example.com', 'password_hash': '!'},
+            {'email': 'not-an-email', 'password_hash': '!'},
+            {'email': 'bob@', 'password_hash': '!'},
+            {'email': 42, 'password_hash': '!'},
+        ])
+        self.assertIn('1 created, 0 updated, 0 skipped, 3 invalid', out)
+        self.assertEqual(list(User.objects.values_list('email', flat=True)), ['alice@example.com'])
+
+    def test_rows_dropped_on_conflict_are_not_counted_as_created(self):
+        make_user('alice@example.com')
+        # As if alice had been inserted elsewhere after the existence check.
+        nothing = {'email': {}, 'uid': {}}
+        with mock.patch.object(ImportUsersCommand, 'existing', return_value=nothing):
+            out = self.run_import([
+                {'email': 'alice@example.com', 'password_hash': '!'},
+                {'email': 'bob@example.com', 'password_hash': '!'},
+            ])
+        self.assertIn('1 created, 0 updated, 1 skipped, 0 invalid', out)
+        self.assertEqual(User.objects.count(), 2)
+
+
+class ProfileRepresentationTests(MediaRootMixin, TestCase):
+    """The compiled representation must match the serializer field for field."""
+
+    def assertMatchesSerializer(self, user):
+        for request in (APIRequestFactory().get('/auth/user/'), None):
+            with self.subTest(request=request):
+                context = {'request': request} if request is not None else {}
+                self.assertEqual(
+                    profile_representation(user, request),
+                    dict(UserProfileSerializer(user, context=context).data),
+                )
+
+    def test_without_media(self):
+        self.assertMatchesSerializer(make_user('alice@example.com', name='Alice', bio=None))
+
+    def test_with_image_cover_and_renditions(self):
+        user = make_user('alice@example.com', name='Alice', bio='Hi')
+        user.image = SimpleUploadedFile('photo.jpg', photo(), content_type='image/jpeg')
+        user.cover = SimpleUploadedFile('cover.png', photo(fmt='PNG'), content_type='image/png')
+        user.image_renditions = {
+            size: {ext: f'profile_images/renditions/photo-{size}.{ext}' for ext in ('webp', 'jpg')}
+            for size in settings.IMAGE_RENDITIONS
+        }
+        user.save()
+        user.refresh_from_db()
+
+        self.assertTrue(user.image and user.cover)
+        self.assertMatchesSerializer(user)
+
+    def test_with_image_only(self):
+        user = make_user('alice@example.com')
+        user.image = SimpleUploadedFile('photo.jpg', photo(), content_type='image/jpeg')
+        user.save()
+        self.assertMatchesSerializer(user)
+
+
+class SignInTests(TestCase):
+
+    def test_outdated_hash_is_upgraded_without_revoking_tokens(self):
+        old = PBKDF2PasswordHasher().encode('secret', 'saltsaltsalt', iterations=1000)
+        user = make_user('alice@example.com', is_active=True, password=old)
+        version = user.auth_version
+
+        serializer = SignInSerializer(data={'email': 'alice@example.com', 'password': 'secret'})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        user.refresh_from_db()
+        self.assertNotEqual(user.password, old)
+        self.assertFalse(hashing.must_update(user.password))
+        self.assertTrue(check_password('secret', user.password))
+        self.assertEqual(user.auth_version, version)
+
+    def test_wrong_password_leaves_the_hash_alone(self):
+        old = PBKDF2PasswordHasher().encode('secret', 'saltsaltsalt', iterations=1000)
+        make_user('alice@example.com', is_active=True, password=old)
+
+        serializer = SignInSerializer(data={'email': 'alice@example.com', 'password': 'wrong'})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(User.objects.get().password, old)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', OTP_TTL=180)
+class SendOtpEmailTests(EagerCeleryMixin, TestCase):
+
+    def test_sends_the_code(self):
+        result = send_otp_email.delay('alice@example.com', '123456', task='sign in')
+
+        self.assertTrue(result.successful())
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['alice@example.com'])
+        self.assertEqual(message.subject, 'Your OTP for sign in')
+        self.assertIn('123456', message.body)
+        self.assertIn('expire in 3 minutes', message.body)
+
+    def test_retries_on_smtp_errors(self):
+        calls = []
+
+        def flaky(*args, **kwargs):
+            calls.append(args)
+            if len(calls) < 3:
+                raise SMTPServerDisconnected('connection dropped')
+            return send_mail(*args, **kwargs)
+
+        with mock.patch('accounts.tasks.send_mail', flaky):
+            result = send_otp_email.delay('alice@example.com', '123456')
+
+        self.assertTrue(result.successful())
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_gives_up_after_max_retries(self):
+        failing = mock.Mock(side_effect=SMTPServerDisconnected('connection dropped'))
+        with mock.patch('accounts.tasks.send_mail', failing):
+            result = send_otp_email.delay('alice@example.com', '123456')
+
+        self.assertTrue(result.failed())
+        self.assertIsInstance(result.result, SMTPServerDisconnected)
+        self.assertEqual(failing.call_count, send_otp_email.max_retries + 1)
+        self.assertEqual(mail.outbox, [])
+
+
+class OTPStoreTestsMixin:
+    store_class = None
+
+    def setUp(self):
+        cache.clear()
+        self.store = self.store_class()
+        self.user = make_user('alice@example.com')
+
+    def verify(self, code):
+        return self.store.verify('alice@example.com', code)
+
+    def test_issued_code_verifies_once(self):
+        code = self.store.issue(self.user)
+        self.assertEqual(self.verify(code)['status'], True)
+        self.assertEqual(self.verify(code)['status'], False)
+
+    def test_wrong_code(self):
+        self.store.issue(self.user)
+        self.assertEqual(self.verify('0000'), {"status": False, "log": "Invalid OTP."})
+
+    def test_locks_out_after_max_attempts(self):
+        code = self.store.issue(self.user)
+        for _ in range(settings.OTP_MAX_ATTEMPTS):
+            self.assertEqual(self.verify('0000')['log'], "Invalid OTP.")
+        # Even the right code is refused once the attempts are spent.
+        self.assertEqual(self.verify(code), self.store.too_many_attempts())
+
+    def test_expired_code_is_refused(self):
+        code = self.store.issue(self.user)
+        with self.expired():
+            self.assertEqual(self.verify(code)['status'], False)
+
+    def test_reissue_resets_attempts(self):
+        self.store.issue(self.user)
+        for _ in range(settings.OTP_MAX_ATTEMPTS):
+            self.verify('0000')
+        code = self.store.issue(self.user)
+        self.assertEqual(self.verify(code)['status'], True)
+
+
+class ModelOTPStoreTests(OTPStoreTestsMixin, TestCase):
+    store_class = ModelOTPStore
+
+    @contextmanager
+    def expired(self):
+        OTP.objects.update(created_at=F('created_at') - timedelta(seconds=settings.OTP_TTL + 1))
+        yield
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheOTPStoreTests(OTPStoreTestsMixin, TestCase):
+    store_class = CacheOTPStore
+
+    @contextmanager
+    def expired(self):
+        later = time.time() + settings.OTP_TTL + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            yield
+
+
+class FetchAvatarTests(EagerCeleryMixin, LocalHTTPMixin, MediaRootMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.http.routes = {'/avatar': lambda query, headers: (200, {'Content-Type': 'image/jpeg'}, photo((600, 300)))}
+        self.user = make_user('alice@example.com', name='Alice')
+
+    def fetch(self):
+        return fetch_avatar.delay(str(self.user.pk), self.url('/avatar'))
+
+    def test_attaches_the_avatar(self):
+        self.assertTrue(self.fetch().successful())
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.image.name, 'profile_images/alice-profile.jpg')
+        with Image.open(self.user.image) as image:
+            self.assertEqual(max(image.size), settings.AVATAR_SIZE)
+        self.assertEqual(set(self.user.image_renditions), set(settings.IMAGE_RENDITIONS))
+        self.assertIsNone(cache.get(f'avatar:user:{self.user.pk}'))
+
+    def test_one_fetch_per_user_at_a_time(self):
+        cache.add(f'avatar:user:{self.user.pk}', 'https://elsewhere.example.com/', 120)
+        self.fetch()
+
+        self.assertEqual(self.requests_to('/avatar'), [])
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.image)
+
+    @override_settings(AVATAR_MAX_BYTES=1024)
+    def test_oversized_download_is_dropped(self):
+        self.assertTrue(self.fetch().successful())
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.image)
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'profile_images')))
+
+    def test_existing_picture_is_kept(self):
+        User.objects.filter(pk=self.user.pk).update(image='profile_images/mine.jpg')
+        self.fetch()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.image.name, 'profile_images/mine.jpg')
+
+    def test_profile_edits_during_the_download_win(self):
+        save = FileSystemStorage.save
+
+        def edited_meanwhile(storage, name, content, **kwargs):
+            User.objects.filter(pk=self.user.pk).update(name='Alice B', image='profile_images/mine.jpg')
+            return save(storage, name, content, **kwargs)
+
+        with mock.patch.object(FileSystemStorage, 'save', edited_meanwhile):
+            self.fetch()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'Alice B')
+        self.assertEqual(self.user.image.name, 'profile_images/mine.jpg')
+        # The downloaded copy is not left behind in storage.
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, 'profile_images')), [])
+
+
+class ProfileValidatorsTests(TestCase):
+    """Conditional requests against the profile, authenticated as in production."""
+
+    def setUp(self):
+        self.user = make_user('alice@example.com', is_active=True, name='Alice')
+        revocation = mock.patch('core.authentication.revocation_list.is_revoked', return_value=False)
+        revocation.start()
+        self.addCleanup(revocation.stop)
+        self.client = APIClient()
+        token = UserRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = reverse('get_profile')
+
+    def test_unchanged_profile_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_saves_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        User.objects.get(pk=self.user.pk).save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_stale_if_match_is_refused(self):
+        etag = self.client.get(self.url)['ETag']
+        user = User.objects.get(pk=self.user.pk)
+        user.bio = 'Edited elsewhere'
+        user.save()
+
+        response = self.client.patch(self.url, {'name': 'Alice B'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(User.objects.get(pk=self.user.pk).name, 'Alice')
+
+    def test_current_if_match_updates(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.patch(self.url, {'name': 'Alice B'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.get(pk=self.user.pk).name, 'Alice B')
+        # The response carries the new version, which GET then serves.
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url)['ETag'], response['ETag'])
+
+
+@mock.patch.object(SlidingWindowThrottle, 'THROTTLE_RATES', {'otp_verify_ip': '2/min', 'otp_verify_email': '100/min'})
+class OtpVerifyThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        make_user('alice@example.com')
+
+    def verify(self):
+        return self.client.post(reverse('verify_otp'), {'email': 'alice@example.com', 'otp_code': '0000'})
+
+    def test_throttled_answer_keeps_the_view_shape(self):
+        self.assertEqual([self.verify().status_code for _ in range(2)], [400, 400])
+
+        response = self.verify()
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['status'], False)
+        self.assertRegex(response.json()['log'], r'^Too many attempts\. Please try again in \d+ seconds?\.$')
+        self.assertNotIn('detail', response.json())
+        self.assertGreater(int(response['Retry-After']), 0)
@@ -9,6 +9,12 @@ urlpatterns = [
     path('verify-otp/', OtpVerifyView.as_view(), name='verify_otp'),
     path('get-otp/', GetOtpView.as_view(), name='get_otp'),
     path('reset-password/', ResetPassword.as_view(), name='reset_password'),
+    path('logout/', LogoutView.as_view(), name='logout'),
     path('profile/', GetProfileView.as_view(), name='get_profile'),
+    path('users/export/', ExportUsersView.as_view(), name='export_users'),
+    path('uploads/', UploadInitView.as_view(), name='upload_init'),
+    path('uploads/<uuid:pk>/', UploadSessionView.as_view(), name='upload_session'),
+    path('uploads/<uuid:pk>/chunks/<int:index>/', UploadChunkView.as_view(), name='upload_chunk'),
+    path('uploads/<uuid:pk>/finalize/', UploadFinalizeView.as_view(), name='upload_finalize'),
     path('', FirebaseLoginView.as_view(), name='firebase_login'),
 ]
\ No newline at end of file
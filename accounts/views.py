@@ -1,61 +1,131 @@
 from .models import *
 from .helper import *
 from .serializers import *
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.validators import validate_image_file_extension
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from .exports import EXPORT_TYPES, UserExportFilter, astream
+from .images import InvalidImage, clean_original
+import os
 from rest_framework.views import APIView
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from rest_framework.response import Response
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework import generics, status,permissions
-from rest_framework_simplejwt.tokens import RefreshToken
+from core.tokens import UserRefreshToken
+from core.revocation import revocation_list
+from rest_framework_simplejwt.exceptions import TokenError
+from django.contrib.auth.hashers import make_password
+from firebase_admin import auth as firebase_auth
+from core import hashing
+from core.throttling import EmailRateThrottle, IPRateThrottle, TooManyAttempts
+from .tasks import fetch_avatar
 
 # Create your views here.
 
-class SignUpView(generics.CreateAPIView):
+class SignUpView(AsyncAPIView):
     serializer_class = SignUpSerializer
     permission_classes = [permissions.AllowAny]
 
-    def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+    async def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data, context={'request': request})
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        user = await sync_to_async(serializer.save)()
+        refresh = UserRefreshToken.for_user(user)
         return Response({
             "status": True,
-            "log": UserProfileSerializer(user).data,
+            "log": profile_representation(user),
             "refresh": str(refresh),
             "access": str(refresh.access_token),
         }, status=status.HTTP_201_CREATED)
 
     
-class SignInView(generics.CreateAPIView):
+class SignInView(AsyncAPIView):
     serializer_class = SignInSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPRateThrottle, EmailRateThrottle]
+    throttle_scope = 'signin'
 
-    def post(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+    async def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data, context={'request': request})
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
+        refresh = UserRefreshToken.for_user(user)
         return Response({
             "status": True,
-            "log": UserProfileSerializer(user).data,
+            "log": profile_representation(user),
             "refresh": str(refresh),
             "access": str(refresh.access_token),
         }, status=status.HTTP_200_OK)
 
 
-class UserRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class ProfileRetrieveMixin:
+    """
+    GET answers with the compiled profile representation. Responses carry an
+    ETag and Last-Modified derived from the user's updated_at, which every
+    save bumps and the auth cache serves with the row, so an unchanged
+    profile is a 304 before anything is serialized, and PUT/PATCH honour
+    If-Match against the same ETag (412 when it is stale).
+    """
+
+    def profile_validators(self, user):
+        version = int(user.updated_at.timestamp() * 1_000_000)
+        return quote_etag(f"{user.pk}:{version}"), int(user.updated_at.timestamp())
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Always revalidate, and keep shared caches out of it.
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        user = self.get_object()
+        etag, last_modified = self.profile_validators(user)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = Response(profile_representation(user, request))
+        return self.set_validators(response, etag, last_modified)
+
+    def update(self, request, *args, **kwargs):
+        # Checked against the row about to be written, not the copy
+        # request.user was served from.
+        etag, last_modified = self.profile_validators(self.get_object())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+        response = super().update(request, *args, **kwargs)
+        return self.set_validators(response, *self.profile_validators(self.updated_profile))
+
+    def perform_update(self, serializer):
+        self.updated_profile = serializer.save()
+
+
+class UserRetrieveUpdateDestroyView(ProfileRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
     def get_object(self):
-        return User.objects.filter(email=self.request.user.email).first()
+        # request.user comes from the auth cache and is current, reads can
+        # use it as is. Writes still load the row they modify.
+        if self.request.method in permissions.SAFE_METHODS:
+            return self.request.user
+        return User.objects.using('default').filter(email=self.request.user.email).first()
 
 
-class GetOtpView(APIView):
+class GetOtpView(AsyncAPIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPRateThrottle, EmailRateThrottle]
+    throttle_scope = 'otp_issue'
 
-    def post(self, request):
+    async def post(self, request):
         email = request.data.get('email')
         task = request.data.get('task', '')
         if not email:
@@ -64,7 +134,7 @@ class GetOtpView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        res = send_otp(email, task)
+        res = await send_otp(email, task)
 
         if res['status']:
             return Response({"status": True, "log": res['log']}, status=status.HTTP_200_OK)
@@ -72,8 +142,22 @@ class GetOtpView(APIView):
             return Response({"status": False,"log": res['log']}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class OtpVerifyView(APIView):
-    def post(self, request):
+class OtpVerifyView(AsyncAPIView):
+    throttle_classes = [IPRateThrottle, EmailRateThrottle]
+    throttle_scope = 'otp_verify'
+
+    def throttled(self, request, wait):
+        # Same 403 lock the OTP store reports once a code's attempts run out.
+        raise TooManyAttempts(wait)
+
+    def handle_exception(self, exc):
+        # In this view's usual shape rather than DRF's {"detail": ...}.
+        if isinstance(exc, TooManyAttempts):
+            headers = {'Retry-After': str(exc.wait)} if exc.wait else {}
+            return Response({"status": False, "log": str(exc.detail)}, status=exc.status_code, headers=headers)
+        return super().handle_exception(exc)
+
+    async def post(self, request):
         email = request.data.get('email')
         otp_code = request.data.get('otp_code')
 
@@ -83,18 +167,18 @@ class OtpVerifyView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        result = verify_otp(email, otp_code)
+        result = await verify_otp(email, otp_code)
 
         if result['status']:
             try:
-                user = User.objects.get(email=email)
+                user = await User.objects.using('default').aget(email=email)
             except User.DoesNotExist:
                 return Response({"status": False,"log": "User not found."}, status=status.HTTP_404_NOT_FOUND)
 
             # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            refresh = UserRefreshToken.for_user(user)
             return Response({
-                "log": UserProfileSerializer(user).data,
+                "log": profile_representation(user),
                 "refresh": str(refresh),
                 "access": str(refresh.access_token),
             }, status=status.HTTP_200_OK)
@@ -123,26 +207,48 @@ class ResetPassword(APIView):
                 status=403)
         
         try:
-            user = User.objects.get(email=email)
-            user.set_password(new_password)
+            user = User.objects.using('default').get(email=email)
+            user.password = hashing.make_password(new_password, 'reset')
             user.save()
             return Response({"status": True, "log": "Password reset successfully"}, status=200)
         except User.DoesNotExist:
             return Response({"error": "User not found"}, status=404)
 
 
-class GetProfileView(generics.RetrieveUpdateDestroyAPIView):
+class LogoutView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                refresh = UserRefreshToken(refresh)
+            except TokenError as e:
+                return Response({"status": False, "log": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if refresh.get('user_id') != str(request.user.pk):
+                return Response({"status": False, "log": "You can only revoke your own tokens."}, status=status.HTTP_403_FORBIDDEN)
+            revocation_list.revoke(refresh)
+
+        revocation_list.revoke(request.auth)
+        return Response({"status": True, "log": "Logged out successfully"}, status=status.HTTP_200_OK)
+
+
+class GetProfileView(ProfileRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = UserProfileSerializer
     
     def get_object(self):
-        return self.request.user
+        # request.user is the cached row without credentials, writes load
+        # the full row.
+        if self.request.method in permissions.SAFE_METHODS:
+            return self.request.user
+        return User.objects.using('default').get(pk=self.request.user.pk)
 
 
-class FirebaseLoginView(APIView):
+class FirebaseLoginView(AsyncAPIView):
     permission_classes = [permissions.AllowAny]
 
-    def post(self, request):
+    async def post(self, request):
         id_token = request.query_params.get('token')
         oauth = request.query_params.get('oauth',True)
 
@@ -150,7 +256,7 @@ class FirebaseLoginView(APIView):
             return Response({'status': False,'log': 'Token is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            decoded_token = firebase_auth.verify_id_token(id_token)
+            decoded_token = await sync_to_async(firebase_auth.verify_id_token)(id_token)
         except Exception as e:
             return Response({'status': False,'log': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
@@ -164,7 +270,7 @@ class FirebaseLoginView(APIView):
         profile_image_url = decoded_token.get('picture')
 
         if oauth:
-            user, created = User.objects.get_or_create(
+            user, created = await User.objects.aget_or_create(
                 email=email,
                 defaults={
                     "uid":uid,
@@ -174,35 +280,26 @@ class FirebaseLoginView(APIView):
                 },
             )
             if created and profile_image_url:
-                img_response = requests.get(profile_image_url)
-                if img_response.status_code == 200:
-                    file_name = f"{slugify(name or email.split('@')[0])}-profile.jpg"
-                    user.image.save(
-                        file_name,
-                        ContentFile(img_response.content),
-                        save=True,
-                    )
+                await sync_to_async(fetch_avatar.delay)(str(user.pk), profile_image_url)
         else:
-            user, created = User.objects.get_or_create(
+            user, created = await User.objects.aget_or_create(
                 email=email,
                 defaults={
                     "uid":uid,
                     'name': request.data.get('name') or "",
                     'is_active': False,
-                    'password': make_password(uid),
+                    'password': await sync_to_async(hashing.make_password)(uid, 'signup'),
                 }
             )
             if not user.is_active:
-                send_otp(user.email)
-
-            print(UserProfileSerializer(user, context={'request': request}).data)
+                await send_otp(user.email)
 
         if user:
-            token = RefreshToken.for_user(user)
+            token = UserRefreshToken.for_user(user)
             return Response({
                 'access': str(token.access_token),
                 'refresh': str(token),
-                'user': UserProfileSerializer(user, context={'request': request}).data,
+                'user': profile_representation(user, request),
                 'status': True,
                 'active': user.is_active,
                 'log': 'Login successful'
@@ -210,3 +307,162 @@ class FirebaseLoginView(APIView):
         else:
             return Response({'status': False,'log': 'Invalid or expired token'}, status=status.HTTP_400_BAD_REQUEST)
 
+
+class ExportUsersView(AsyncAPIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    async def get(self, request):
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in EXPORT_TYPES:
+            return Response({"status": False, "log": "type must be ndjson or csv."}, status=status.HTTP_400_BAD_REQUEST)
+
+        filterset = UserExportFilter(request.query_params, queryset=User.objects.all())
+        if not filterset.is_valid():
+            return Response({"status": False, "log": filterset.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        # An async iterator, so ASGI sends each piece as the rows arrive.
+        _, content_type = EXPORT_TYPES[export_type]
+        response = StreamingHttpResponse(astream(export_type, filterset.qs), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="users.{export_type}"'
+        return response
+
+
+class UploadInitView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        field = request.data.get('field')
+        file_name = request.data.get('file_name')
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            size = 0
+
+        if field not in dict(UploadSession.FIELD) or not file_name or size <= 0:
+            return Response(
+                {"status": False, "log": "field (image or cover), file_name and size are required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            return Response({"status": False, "log": "File is too large."}, status=status.HTTP_400_BAD_REQUEST)
+        # The stored name takes the extension of the format Pillow detects on
+        # finalize, this only turns away what can't be an image up front.
+        try:
+            validate_image_file_extension(File(None, name=file_name))
+        except ValidationError as e:
+            return Response({"status": False, "log": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = UploadSession.objects.create(
+            user=request.user,
+            field=field,
+            file_name=os.path.basename(file_name),
+            size=size,
+            chunk_size=settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+        )
+        os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+        with open(upload.path, 'wb') as f:
+            f.truncate(size)
+
+        return Response({
+            "status": True,
+            "log": {"upload_id": upload.id, "chunk_size": upload.chunk_size, "chunk_count": upload.chunk_count},
+        }, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        upload = get_object_or_404(UploadSession, pk=pk, user=request.user)
+        return Response({
+            "status": True,
+            "log": {"chunk_count": upload.chunk_count, "received": sorted(upload.received)},
+        }, status=status.HTTP_200_OK)
+
+    def delete(self, request, pk):
+        get_object_or_404(UploadSession, pk=pk, user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadChunkView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def put(self, request, pk, index):
+        upload = get_object_or_404(UploadSession, pk=pk, user=request.user)
+        if index >= upload.chunk_count:
+            return Response({"status": False, "log": "Chunk index out of range."}, status=status.HTTP_400_BAD_REQUEST)
+
+        expected = upload.chunk_length(index)
+        if int(request.META.get('CONTENT_LENGTH') or 0) != expected:
+            return Response(
+                {"status": False, "log": f"Chunk {index} must be exactly {expected} bytes."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Stream the body straight into its slot in the part file, a retried
+        # chunk just overwrites the same range.
+        written = 0
+        with open(upload.path, 'r+b') as f:
+            f.seek(index * upload.chunk_size)
+            while written < expected:
+                data = request.stream.read(min(64 * 1024, expected - written))
+                if not data:
+                    break
+                f.write(data)
+                written += len(data)
+        if written != expected:
+            return Response({"status": False, "log": "Incomplete chunk."}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            upload = UploadSession.objects.select_for_update().get(pk=upload.pk)
+            if index not in upload.received:
+                upload.received.append(index)
+                upload.save(update_fields=['received'])
+
+        return Response({
+            "status": True,
+            "log": {"received": len(upload.received), "chunk_count": upload.chunk_count},
+        }, status=status.HTTP_200_OK)
+
+
+class UploadFinalizeView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        # The chunks were recorded just now, a replica may not have them yet.
+        upload = get_object_or_404(UploadSession.objects.using('default'), pk=pk, user=request.user)
+        missing = sorted(set(range(upload.chunk_count)) - set(upload.received))
+        if missing:
+            return Response(
+                {"status": False, "log": "Upload is incomplete.", "missing": missing[:100]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Re-encoding a large upload takes a while, so it is validated, cleaned
+        # and stored before anything is locked.
+        user = User.objects.using('default').get(pk=request.user.pk)
+        field_file = getattr(user, upload.field)
+        try:
+            with open(upload.path, 'rb') as f:
+                cleaned = clean_original(f, upload.file_name)
+            field_file.save(cleaned.name, cleaned, save=False)
+        except FileNotFoundError:
+            # A concurrent finalize has taken the session.
+            raise Http404
+        except InvalidImage:
+            upload.delete()
+            return Response({"status": False, "log": "Not a valid image."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Only attaching the file and dropping the session hold the lock, a
+        # concurrent finalize waits here and then finds the session gone.
+        with transaction.atomic():
+            if not UploadSession.objects.select_for_update().filter(pk=upload.pk).exists():
+                field_file.delete(save=False)
+                raise Http404
+            user.save(update_fields=[upload.field])
+            upload.delete()
+
+        return Response({
+            "status": True,
+            "log": profile_representation(user, request),
+        }, status=status.HTTP_200_OK)
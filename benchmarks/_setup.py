@@ -0,0 +1,84 @@
+"""
+Bootstrap shared by the benchmark scripts. It puts the project on sys.path,
+points Celery and email at in-process stand-ins and creates a throwaway
+test database that is dropped again on exit.
+
+    python benchmarks/<script>.py [--project PATH] [script options]
+
+--project runs a script against another checkout, e.g. a `git worktree` of
+an older commit, to get before/after numbers from the same script.
+"""
+import argparse
+import atexit
+import importlib.machinery
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup(parser=None, **env):
+    parser = parser or argparse.ArgumentParser()
+    parser.add_argument('--project', default=str(ROOT), help="Checkout to benchmark.")
+    args = parser.parse_args()
+
+    sys.path.insert(0, args.project)
+    # The hashing pool's workers would re-run the unguarded script as
+    # __mp_main__ (and create a database of their own), unless __main__ looks
+    # like a module they can't import.
+    main = sys.modules['__main__']
+    if main.__spec__ is None:
+        main.__spec__ = importlib.machinery.ModuleSpec('__main__', None)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    os.environ.setdefault('CELERY_BROKER_URL', 'memory://')
+    os.environ.setdefault('CELERY_TASK_ALWAYS_EAGER', 'True')
+    for key, value in env.items():
+        os.environ.setdefault(key, value)
+
+    import django
+    django.setup()
+
+    from django.db import connections
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+
+    created = []
+    for alias in connections:
+        connection = connections[alias]
+        if connection.settings_dict.get('TEST', {}).get('MIRROR'):
+            continue
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        # Older checkouts predate the MIGRATE=False test setting.
+        test_settings['MIGRATE'] = False
+        # The default in-memory sqlite test database is a shared cache, where
+        # concurrent writers get "database table is locked" instead of waiting.
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f'benchmark-{os.getpid()}-{alias}.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        created.append((connection, old_name))
+
+    @atexit.register
+    def teardown():
+        for connection, old_name in created:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    print(f"project {args.project}, database {connections['default'].vendor}")
+    return args
+
+
+class Timer:
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+
+
+def report(label, operations, elapsed, unit='ops'):
+    rate = operations / elapsed if elapsed else float('inf')
+    print(f"{label:<40} {operations:>10} {unit} in {elapsed:8.3f}s  {rate:>12,.0f} {unit}/s")
@@ -0,0 +1,88 @@
+"""
+Requests/sec of the auth endpoints driven through the ASGI application in
+one process, i.e. what a single uvicorn worker can serve.
+
+Before/after a change: run it on both checkouts with --project, e.g.
+    git worktree add /tmp/before <commit>
+    python benchmarks/auth_views.py --project /tmp/before
+    python benchmarks/auth_views.py
+SQLite vs Postgres: the same script with DB_ENGINE=sqlite or DB_ENGINE=postgres
+and the DB_* variables read by core/settings.py. On Postgres, DB_POOL=True or
+DB_POOL=False compares the psycopg pool with persistent connections, and
+DB_STATEMENT_TIMEOUT applies the web processes' statement_timeout.
+"""
+import argparse
+import asyncio
+from collections import Counter
+from _setup import Timer, report, setup
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--users', type=int, default=200)
+parser.add_argument('--concurrency', type=int, default=32)
+parser.add_argument('--requests', type=int, default=2000, help="Per endpoint.")
+parser.add_argument('--endpoints', default='signin,get-otp,profile')
+args = setup(parser, **{
+    # Measure the views, not the throttles.
+    f'THROTTLE_{scope}_{kind}': '1000000/min'
+    for scope in ('SIGNIN', 'OTP_ISSUE', 'OTP_VERIFY') for kind in ('IP', 'EMAIL')
+})
+
+import httpx
+from django.contrib.auth.hashers import make_password
+from django.core.asgi import get_asgi_application
+from accounts.models import User
+
+try:
+    from core.tokens import UserRefreshToken as RefreshToken
+except ImportError:
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+PASSWORD = 'bench-Password-123'
+encoded = make_password(PASSWORD)
+users = User.objects.bulk_create([
+    User(email=f'bench{index}@example.com', name=f'Bench {index}', password=encoded, is_active=True)
+    for index in range(args.users)
+])
+tokens = [str(RefreshToken.for_user(user).access_token) for user in users]
+
+
+def signin(client, index):
+    user = users[index % len(users)]
+    return client.post('/auth/signin/', json={'email': user.email, 'password': PASSWORD})
+
+
+def get_otp(client, index):
+    return client.post('/auth/get-otp/', json={'email': users[index % len(users)].email})
+
+
+def profile(client, index):
+    token = tokens[index % len(tokens)]
+    return client.get('/auth/profile/', headers={'Authorization': f'Bearer {token}'})
+
+
+ENDPOINTS = {'signin': signin, 'get-otp': get_otp, 'profile': profile}
+
+
+async def run(name, make_request, total):
+    transport = httpx.ASGITransport(app=get_asgi_application())
+    statuses = Counter()
+    async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+        pending = iter(range(total))
+
+        async def worker():
+            for index in pending:
+                response = await make_request(client, index)
+                statuses[response.status_code] += 1
+
+        with Timer() as timer:
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return timer.elapsed, statuses
+
+
+for name in args.endpoints.split(','):
+    make_request = ENDPOINTS[name]
+    # Warm up process pools, connections and caches.
+    asyncio.run(run(name, make_request, args.concurrency))
+    elapsed, statuses = asyncio.run(run(name, make_request, args.requests))
+    report(f"{name} (c={args.concurrency})", args.requests, elapsed, 'req')
+    print(f"{'':<40} statuses {dict(statuses)}")
@@ -0,0 +1,60 @@
+"""
+JSON render/parse throughput of DRF's stdlib JSONRenderer/JSONParser vs the
+orjson ones in core/, on a page of --items profile-shaped payloads (UUIDs,
+datetimes, nested renditions, non-ASCII text). Also checks that both
+renderers produce the same bytes.
+"""
+import argparse
+import io
+import uuid
+from _setup import Timer, report, setup
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--items', type=int, default=50)
+parser.add_argument('--iterations', type=int, default=2000)
+args = setup(parser)
+
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+
+renditions = {
+    size: {ext: f'https://cdn.example.com/profile_images/renditions/alice-{size}.{ext}' for ext in ('webp', 'jpg')}
+    for size in ('small', 'medium', 'large')
+}
+payload = {
+    'next': 'https://api.example.com/auth/users/?cursor=WyIyMDI2LTEwLTE4IiwgIjAxOTAiXQ==',
+    'results': [
+        {
+            'id': uuid.uuid4(),
+            'email': f'user{index}@example.com',
+            'name': 'Zoë Ångström 日本',
+            'bio': 'Line one line two. ' * 4,
+            'role': 'user',
+            'date_joined': timezone.now(),
+            'image': 'https://cdn.example.com/profile_images/alice.jpg',
+            'cover': None,
+            'image_renditions': renditions,
+            'cover_renditions': {},
+        }
+        for index in range(args.items)
+    ],
+}
+
+assert ORJSONRenderer().render(payload) == JSONRenderer().render(payload), "renderers disagree"
+body = JSONRenderer().render(payload)
+print(f"{'':<40} {len(body):,} byte page of {args.items} items")
+
+for label, renderer in (('JSONRenderer', JSONRenderer()), ('ORJSONRenderer', ORJSONRenderer())):
+    with Timer() as timer:
+        for _ in range(args.iterations):
+            renderer.render(payload)
+    report(f'render, {label}', args.iterations, timer.elapsed, 'pages')
+
+for label, json_parser in (('JSONParser', JSONParser()), ('ORJSONParser', ORJSONParser())):
+    with Timer() as timer:
+        for _ in range(args.iterations):
+            json_parser.parse(io.BytesIO(body))
+    report(f'parse, {label}', args.iterations, timer.elapsed, 'pages')
@@ -0,0 +1,51 @@
+"""
+ModelOTPStore.verify latency as the OTP table grows to --rows (default 1M).
+Rows are spread over --users users. Each step times --samples verify calls
+with a wrong code for random users. With the (user, -created_at) index the
+median should stay flat from the first step to the last.
+"""
+import argparse
+import random
+import statistics
+import time
+from _setup import setup
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--rows', type=int, default=1_000_000)
+parser.add_argument('--users', type=int, default=10_000)
+parser.add_argument('--steps', type=int, default=4)
+parser.add_argument('--samples', type=int, default=500)
+args = setup(parser)
+
+from accounts.models import OTP, User
+from accounts.otp import ModelOTPStore
+
+users = User.objects.bulk_create([
+    User(email=f'otp{index}@example.com', password='!') for index in range(args.users)
+])
+store = ModelOTPStore()
+# Unlimited attempts, so every sample reaches the attempt update.
+store.max_attempts = 10 ** 9
+
+seeded = 0
+for step in range(1, args.steps + 1):
+    target = args.rows * step // args.steps
+    while seeded < target:
+        batch = min(10_000, target - seeded)
+        OTP.objects.bulk_create([
+            OTP(user=users[(seeded + index) % len(users)], otp='1234')
+            for index in range(batch)
+        ])
+        seeded += batch
+
+    latencies = []
+    for _ in range(args.samples):
+        email = random.choice(users).email
+        started = time.perf_counter()
+        store.verify(email, '0000')
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(
+        f"{seeded:>10,} rows  median {statistics.median(latencies):6.3f} ms  "
+        f"p95 {latencies[int(len(latencies) * 0.95)]:6.3f} ms"
+    )
@@ -0,0 +1,73 @@
+"""
+Token revocation at --tokens revoked jtis (default 1M):
+  - time to build a worker's Bloom filter from the table
+  - is_revoked() throughput for valid tokens (filter misses) and revoked ones
+  - is_revoked() latency while a full rebuild runs on its background thread,
+    which must stay in the same range as without one
+"""
+import argparse
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from _setup import Timer, report, setup
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--tokens', type=int, default=1_000_000)
+parser.add_argument('--checks', type=int, default=100_000)
+args = setup(parser)
+
+from django.utils import timezone
+from accounts.models import RevokedToken
+from core.revocation import RevocationList
+
+expires_at = timezone.now() + timedelta(days=7)
+revoked = []
+with Timer() as timer:
+    for start in range(0, args.tokens, 10_000):
+        batch = [uuid.uuid4().hex for _ in range(min(10_000, args.tokens - start))]
+        RevokedToken.objects.bulk_create([RevokedToken(jti=jti, expires_at=expires_at) for jti in batch])
+        revoked.extend(batch[:10])
+report('seed RevokedToken rows', args.tokens, timer.elapsed, 'rows')
+
+revocations = RevocationList(capacity=max(args.tokens, 1), refresh_interval=5, rebuild_interval=600)
+with Timer() as timer:
+    revocations._start_rebuild()
+    revocations._rebuild_thread.join()
+report('build filter', args.tokens, timer.elapsed, 'jtis')
+print(f"{'':<40} {revocations.stats()['size_bytes'] / 2 ** 20:.1f} MiB, {revocations.stats()['hashes']} hashes")
+
+valid = [uuid.uuid4().hex for _ in range(args.checks)]
+with Timer() as timer:
+    false_positives = sum(revocations.is_revoked(jti) for jti in valid)
+report('is_revoked, valid tokens', args.checks, timer.elapsed, 'checks')
+print(f"{'':<40} {revocations.stats()['filter_hits']} filter hits, {false_positives} wrongly revoked")
+
+with Timer() as timer:
+    for index in range(1000):
+        assert revocations.is_revoked(revoked[index % len(revoked)])
+report('is_revoked, revoked tokens', 1000, timer.elapsed, 'checks')
+
+
+def latencies(count):
+    samples = []
+    for index in range(count):
+        started = time.perf_counter()
+        revocations.is_revoked(valid[index % len(valid)])
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)], samples[-1]
+
+
+print("is_revoked latency ms (median / p99 / max)")
+print("  idle:          %.4f / %.4f / %.3f" % latencies(20_000))
+revocations._rebuilt = time.monotonic() - 3600
+revocations.is_revoked('trigger')
+thread = revocations._rebuild_thread
+samples = []
+while thread is not None and thread.is_alive():
+    samples.append(latencies(1000))
+if samples:
+    print("  during rebuild: %.4f / %.4f / %.3f" % (
+        statistics.median(s[0] for s in samples), max(s[1] for s in samples), max(s[2] for s in samples),
+    ))
@@ -0,0 +1,60 @@
+"""
+Messages/sec through PooledEmailBackend against Django's stock SMTP backend,
+both sending to a local aiosmtpd server one message per send, as the OTP
+task does. --handshake-ms adds a delay to every EHLO to stand in for the
+TLS handshake and login a real provider costs.
+"""
+import argparse
+import asyncio
+import socket
+from _setup import Timer, report, setup
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--messages', type=int, default=500)
+parser.add_argument('--handshake-ms', type=float, default=20)
+args = setup(parser)
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import SMTP
+from django.core.mail import EmailMessage
+from django.core.mail.backends.smtp import EmailBackend
+from core.mail import PooledEmailBackend
+
+
+class SlowHandshakeSMTP(SMTP):
+
+    async def smtp_EHLO(self, hostname):
+        await asyncio.sleep(args.handshake_ms / 1000)
+        return await super().smtp_EHLO(hostname)
+
+
+class SlowHandshakeController(Controller):
+
+    def factory(self):
+        return SlowHandshakeSMTP(self.handler)
+
+
+class Sink:
+
+    async def handle_DATA(self, server, session, envelope):
+        return '250 OK'
+
+
+with socket.socket() as sock:
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+
+server = SlowHandshakeController(Sink(), hostname='127.0.0.1', port=port)
+server.start()
+options = dict(host='127.0.0.1', port=port, username='', password='', use_tls=False, use_ssl=False, timeout=5)
+
+try:
+    for name, backend_class in (('smtp.EmailBackend', EmailBackend), ('PooledEmailBackend', PooledEmailBackend)):
+        with Timer() as timer:
+            for index in range(args.messages):
+                message = EmailMessage('Your OTP', f'Code {index}', 'noreply@example.com', ['user@example.com'])
+                backend_class(**options).send_messages([message])
+        report(name, args.messages, timer.elapsed, 'msg')
+finally:
+    PooledEmailBackend.close_all()
+    server.stop()
@@ -0,0 +1,59 @@
+"""
+Insert throughput of random (uuid4) vs time-ordered (uuid7) primary keys as
+a table grows to --rows (default 3M). Two throwaway tables of the same shape
+as the User id are filled in turns, --batch rows per bulk_create, and every
+step reports rows/s for each. Random keys land all over the primary key
+index, so once it outgrows the cache their rate falls while uuid7 keeps
+appending at the right edge.
+"""
+import argparse
+import uuid
+from _setup import Timer, setup
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--rows', type=int, default=3_000_000)
+parser.add_argument('--batch', type=int, default=10_000)
+parser.add_argument('--steps', type=int, default=6)
+args = setup(parser)
+
+from django.db import connection, models
+from core.utils import uuid7
+
+
+def keyed_model(name, default):
+    meta = type('Meta', (), {'app_label': 'accounts', 'db_table': f'bench_{name}', 'managed': False})
+    return type(f'Bench{name.title()}', (models.Model,), {
+        '__module__': __name__,
+        'Meta': meta,
+        'id': models.UUIDField(primary_key=True, default=default, editable=False),
+        'email': models.CharField(max_length=255),
+    })
+
+
+tables = {'uuid4': keyed_model('uuid4', uuid.uuid4), 'uuid7': keyed_model('uuid7', uuid7)}
+with connection.schema_editor() as editor:
+    for model in tables.values():
+        editor.create_model(model)
+
+seeded = 0
+print(f"{'rows':>10}  " + "  ".join(f"{name:>13}" for name in tables))
+for step in range(1, args.steps + 1):
+    target = args.rows * step // args.steps
+    elapsed = dict.fromkeys(tables, 0.0)
+    start = seeded
+    while seeded < target:
+        batch = min(args.batch, target - seeded)
+        for name, model in tables.items():
+            rows = [model(email=f'user{seeded + index}@example.com') for index in range(batch)]
+            with Timer() as timer:
+                model.objects.bulk_create(rows)
+            elapsed[name] += timer.elapsed
+        seeded += batch
+    inserted = seeded - start
+    print(f"{seeded:>10,}  " + "  ".join(f"{inserted / elapsed[name]:>8,.0f} rows/s" for name in tables))
+
+if connection.vendor == 'postgresql':
+    with connection.cursor() as cursor:
+        for name in tables:
+            cursor.execute("SELECT pg_relation_size(%s)", [f'bench_{name}_pkey'])
+            print(f"{name} primary key index: {cursor.fetchone()[0] / 2 ** 20:.0f} MiB")
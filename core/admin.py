@@ -0,0 +1,127 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from unfold.admin import ModelAdmin
+from .pagination import estimate_table_rows, keyset_filter
+from .utils import statement_timeout
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Avoids a COUNT(*) per changelist page: the unfiltered table uses the
+    planner estimate on Postgres, anything else an exact count cached for
+    `count_cache_timeout` seconds.
+    """
+
+    count_cache_timeout = 60
+
+    def _query_key(self):
+        try:
+            sql = str(self.object_list.query)
+        except Exception:
+            return None
+        return hashlib.md5(f"{self.object_list.db}:{sql}".encode()).hexdigest()
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_table_rows(queryset)
+            if estimate:
+                return estimate
+
+        key = self._query_key()
+        count = cache.get(f"admin:count:{key}") if key else None
+        if count is None:
+            with statement_timeout(settings.ADMIN_COUNT_STATEMENT_TIMEOUT, using=queryset.db):
+                count = Paginator.count.func(self)
+            if key:
+                cache.set(f"admin:count:{key}", count, self.count_cache_timeout)
+        return count
+
+
+class KeysetPaginator(EstimatedCountPaginator):
+    """
+    Pages through the changelist by seeking past the last row of the previous
+    page instead of OFFSET, whenever the list is in `keyset_ordering` (the
+    admin's declared, indexed ordering) and that page has been seen. Jumping
+    straight to a deep page falls back to OFFSET once and then continues by
+    keyset. Any other ordering, e.g. a column header sort, pages by OFFSET:
+    its values may be NULL or follow a related model's ordering, which a
+    plain comparison on the column can't seek past.
+    """
+
+    boundary_timeout = 600
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, keyset_ordering=None):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.keyset_ordering = keyset_ordering
+
+    def _normalize(self, ordering):
+        # The changelist repeats the admin's ordering after its own, a repeat
+        # of a field already sorted on changes nothing.
+        pk = self.object_list.model._meta.pk.name
+        normalized = {}
+        for field in ordering:
+            if isinstance(field, str) and field.lstrip('-') == 'pk':
+                field = field.replace('pk', pk)
+            normalized.setdefault(field.lstrip('-') if isinstance(field, str) else field, field)
+        return tuple(normalized.values())
+
+    def _keyset_ordering(self):
+        if not self.keyset_ordering:
+            return None
+        ordering = self._normalize(self.object_list.query.order_by)
+        if ordering != self._normalize(self.keyset_ordering):
+            return None
+        if not all(isinstance(field, str) for field in ordering):
+            return None
+        if ordering[-1].lstrip('-') != self.object_list.model._meta.pk.name:
+            return None
+        return ordering
+
+    def page(self, number):
+        number = self.validate_number(number)
+        ordering = self._keyset_ordering()
+        key = self._query_key()
+        if ordering is None or key is None:
+            return super().page(number)
+
+        boundary = cache.get(f"admin:keyset:{key}:{number - 1}") if number > 1 else None
+        if number > 1 and boundary is None:
+            return self._remember(super().page(number), ordering, key)
+
+        queryset = self.object_list
+        if boundary is not None:
+            queryset = queryset.filter(keyset_filter(ordering, boundary))
+        object_list = list(queryset[:self.per_page])
+        return self._remember(self._get_page(object_list, number, self), ordering, key)
+
+    def _remember(self, page, ordering, key):
+        object_list = list(page.object_list)
+        if object_list:
+            last = object_list[-1]
+            values = [getattr(last, field.lstrip('-')) for field in ordering]
+            cache.set(f"admin:keyset:{key}:{page.number}", values, self.boundary_timeout)
+        page.object_list = object_list
+        return page
+
+
+class ScalableModelAdmin(ModelAdmin):
+    """
+    Changelist settings for tables with millions of rows: keyset paging,
+    estimated counts and no second full-table count for "show all".
+    Subclasses should set an `ordering` backed by an index and ending in
+    the primary key, and use autocomplete_fields for foreign keys.
+    """
+
+    paginator = KeysetPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page, keyset_ordering=self.get_ordering(request),
+        )
@@ -5,6 +5,8 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Requests get a statement_timeout, other processes don't (see settings).
+os.environ.setdefault('DB_STATEMENT_TIMEOUT', '5000')
 django.setup()
 
 application = get_asgi_application()
@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .revocation import revocation_list
+
+
+class UserCache:
+    """
+    Two-tier cache of user rows: an in-process LRU in front of the shared
+    cache. Each user has a version stamp in the shared cache that is replaced
+    on every save/delete, and entries in either tier are only served while
+    they carry the current stamp. One small key read per request keeps every
+    worker consistent without touching the users table.
+
+    Only column values are cached, never the password hash. Users are
+    rebuilt with from_db() and the password deferred, so code that does need
+    it loads it from the database on access.
+
+    The stamps only keep workers consistent if they all see the same cache.
+    With shared=False (a per-process locmem cache) an invalidation would only
+    reach the worker that saved the user, and the others would keep serving
+    a stale block/role/auth_version, so both tiers are skipped and every
+    lookup reads the row.
+    """
+
+    excluded_fields = ('password',)
+
+    def __init__(self, size=1024, local_ttl=30, shared_ttl=300, shared=True):
+        self.size = size
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self.shared = shared
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _version_key(self, pk):
+        return f"auth:user:{pk}:version"
+
+    def _user_key(self, pk):
+        return f"auth:user:{pk}:values"
+
+    def _fields(self):
+        return tuple(
+            field.attname for field in get_user_model()._meta.concrete_fields
+            if field.attname not in self.excluded_fields
+        )
+
+    def _build(self, fields, values):
+        return get_user_model().from_db('default', fields, values)
+
+    def version(self, pk):
+        key = self._version_key(pk)
+        version = cache.get(key)
+        if version is None:
+            # A fresh timestamp rather than a counter, so an evicted stamp can
+            # never come back with a value an old entry still carries.
+            version = time.time_ns()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        return version
+
+    def _fetch(self, pk, fields):
+        try:
+            # Straight from the primary, a lagging replica would be cached
+            # under the new version until the next invalidation.
+            return get_user_model().objects.using('default').filter(pk=pk).values_list(*fields).first()
+        except (ValueError, ValidationError):
+            return None
+
+    def get(self, pk):
+        pk = str(pk)
+        fields = self._fields()
+        if not self.shared:
+            values = self._fetch(pk, fields)
+            return None if values is None else self._build(fields, values)
+
+        version = self.version(pk)
+
+        with self._lock:
+            entry = self._local.get(pk)
+            if entry and entry[0] == version and entry[1] > time.monotonic():
+                self._local.move_to_end(pk)
+                return self._build(fields, entry[2])
+
+        entry = cache.get(self._user_key(pk))
+        if entry and entry[0] == version:
+            values = entry[1]
+        else:
+            values = self._fetch(pk, fields)
+            if values is None:
+                return None
+            cache.set(self._user_key(pk), (version, values), self.shared_ttl)
+
+        with self._lock:
+            self._local[pk] = (version, time.monotonic() + self.local_ttl, values)
+            self._local.move_to_end(pk)
+            while len(self._local) > self.size:
+                self._local.popitem(last=False)
+        return self._build(fields, values)
+
+    def invalidate(self, pk):
+        pk = str(pk)
+        cache.set(self._version_key(pk), time.time_ns(), None)
+        cache.delete(self._user_key(pk))
+        with self._lock:
+            self._local.pop(pk, None)
+
+
+_config = getattr(settings, 'AUTH_USER_CACHE', {})
+user_cache = UserCache(
+    size=_config.get('SIZE', 1024),
+    local_ttl=_config.get('LOCAL_TTL', 30),
+    shared_ttl=_config.get('SHARED_TTL', 300),
+    shared=_config.get('SHARED', True),
+)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if revocation_list.is_revoked(validated_token[api_settings.JTI_CLAIM]):
+            raise InvalidToken(_("Token has been revoked"))
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if getattr(user, "block", False):
+            raise AuthenticationFailed(_("User is blocked"), code="user_blocked")
+
+        # Tokens carry the auth_version they were issued at, role/block/
+        # password changes bump it and retire every older token.
+        version = validated_token.get("ver")
+        if version is not None and version != user.auth_version:
+            raise AuthenticationFailed(_("Token is no longer valid"), code="token_outdated")
+
+        return user
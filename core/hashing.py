@@ -0,0 +1,146 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Server is busy, please try again shortly.'
+    default_code = 'hashing_busy'
+
+
+def _init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+
+class HashingExecutor:
+    """
+    Runs password hashing on a process pool so PBKDF2 never blocks a
+    request worker. Every caller passes a label (signin, signup, ...) and
+    each label gets its own concurrency cap, so a burst on one endpoint
+    cannot take every slot. When a label is full the caller waits up to
+    `timeout` seconds for a slot (0 fails fast) and then gets HashingBusy.
+    """
+
+    def __init__(self, workers=2, limits=None, timeout=0):
+        self.workers = workers
+        self.limits = limits or {'default': 8}
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._stats = {}
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('forkserver'),
+                        initializer=_init_worker,
+                    )
+        return self._pool
+
+    def _get_slot(self, label):
+        with self._lock:
+            if label not in self._slots:
+                limit = self.limits.get(label, self.limits.get('default', 8))
+                self._slots[label] = threading.BoundedSemaphore(limit)
+                self._stats[label] = {
+                    'limit': limit, 'waiting': 0, 'in_flight': 0,
+                    'completed': 0, 'rejected': 0,
+                }
+            return self._slots[label], self._stats[label]
+
+    def submit(self, label, fn, *args):
+        slot, stats = self._get_slot(label)
+
+        with self._lock:
+            stats['waiting'] += 1
+        if self.timeout:
+            acquired = slot.acquire(timeout=self.timeout)
+        else:
+            acquired = slot.acquire(blocking=False)
+        with self._lock:
+            stats['waiting'] -= 1
+            if not acquired:
+                stats['rejected'] += 1
+                raise HashingBusy()
+            stats['in_flight'] += 1
+
+        def release(future):
+            with self._lock:
+                stats['in_flight'] -= 1
+                stats['completed'] += 1
+            slot.release()
+
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except Exception:
+            release(None)
+            raise
+        future.add_done_callback(release)
+        return future
+
+    def run(self, label, fn, *args):
+        return self.submit(label, fn, *args).result()
+
+    def stats(self):
+        with self._lock:
+            labels = {label: dict(values) for label, values in self._stats.items()}
+        in_flight = sum(values['in_flight'] for values in labels.values())
+        waiting = sum(values['waiting'] for values in labels.values())
+        return {
+            'workers': self.workers,
+            'in_flight': in_flight,
+            'waiting': waiting,
+            # Jobs accepted but not yet picked up by a pool process, plus
+            # callers still blocked on a label slot.
+            'queue_depth': waiting + max(0, in_flight - self.workers),
+            'labels': labels,
+        }
+
+
+_config = getattr(settings, 'PASSWORD_HASHING', {})
+executor = HashingExecutor(
+    workers=_config.get('WORKERS', 2),
+    limits=_config.get('LIMITS'),
+    timeout=_config.get('TIMEOUT', 0),
+)
+
+
+def make_password(password, label='default'):
+    # Unusable passwords are just a random marker, nothing to offload.
+    if password is None:
+        return hashers.make_password(None)
+    return executor.run(label, hashers.make_password, password)
+
+
+def must_update(encoded):
+    """Whether `encoded` is due a rehash with the preferred hasher and settings."""
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def check_password(password, encoded, label='default', setter=None):
+    """
+    hashers.check_password on the pool. The setter can't cross into the pool
+    process, so it is called here, with the raw password, when the password
+    is correct and its hash is outdated, as Django does on login.
+    """
+    if password is None or not encoded or not hashers.is_password_usable(encoded):
+        return False
+    correct = executor.run(label, hashers.check_password, password, encoded)
+    if correct and setter is not None and must_update(encoded):
+        setter(password)
+    return correct
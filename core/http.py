@@ -0,0 +1,43 @@
+import asyncio
+import threading
+import weakref
+import httpx
+from django.conf import settings
+
+# Shared keep-alive clients for outbound calls (identity providers, avatar
+# CDNs). max_connections bounds how many requests run at once, callers over
+# the limit wait up to POOL_TIMEOUT for a free connection.
+_config = getattr(settings, 'OUTBOUND_HTTP', {})
+TIMEOUT = httpx.Timeout(
+    _config.get('TIMEOUT', 10),
+    connect=_config.get('CONNECT_TIMEOUT', 5),
+    pool=_config.get('POOL_TIMEOUT', 5),
+)
+LIMITS = httpx.Limits(
+    max_connections=_config.get('MAX_CONNECTIONS', 50),
+    max_keepalive_connections=_config.get('MAX_KEEPALIVE', 20),
+    keepalive_expiry=_config.get('KEEPALIVE_EXPIRY', 30),
+)
+
+_client = None
+_lock = threading.Lock()
+# An AsyncClient is bound to the event loop it first runs on.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(timeout=TIMEOUT, limits=LIMITS, follow_redirects=True)
+    return _client
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(timeout=TIMEOUT, limits=LIMITS, follow_redirects=True)
+        _async_clients[loop] = client
+    return client
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import re
+import time
+import httpx
+import jwt
+from .http import get_async_client
+
+logger = logging.getLogger(__name__)
+
+
+class JWKSCache:
+    """
+    Parsed signing keys of an OIDC provider, by kid.
+
+    Keys are kept for the Cache-Control max-age of the JWKS response and
+    refreshed in the background once that passes, callers keep using the
+    current keys meanwhile. An unknown kid forces a refetch (at most once per
+    `min_refetch_interval`), and concurrent fetches share one request. If the
+    provider is unreachable the last good keys keep being served.
+    """
+
+    def __init__(self, url, default_max_age=3600, min_refetch_interval=30, retry_after=60):
+        self.url = url
+        self.default_max_age = default_max_age
+        self.min_refetch_interval = min_refetch_interval
+        self.retry_after = retry_after
+        self._keys = {}
+        self._expires = 0.0
+        self._fetched = 0.0
+        self._inflight = None
+
+    async def get_key(self, kid):
+        now = time.monotonic()
+        if not self._keys:
+            await self._refresh()
+        elif now >= self._expires:
+            self._refresh()
+
+        key = self._keys.get(kid)
+        if key is None and time.monotonic() - self._fetched >= self.min_refetch_interval:
+            await self._refresh()
+            key = self._keys.get(kid)
+        return key
+
+    def _refresh(self):
+        # Single flight: everyone waiting on a refresh shares one fetch.
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._fetch())
+        return asyncio.shield(self._inflight)
+
+    async def _fetch(self):
+        try:
+            response = await get_async_client().get(self.url)
+            response.raise_for_status()
+            keys = {}
+            for jwk in response.json().get('keys', []):
+                if jwk.get('kid'):
+                    keys[jwk['kid']] = jwt.PyJWK(jwk).key
+        except (httpx.HTTPError, ValueError, jwt.PyJWTError) as e:
+            logger.warning("JWKS fetch from %s failed, serving cached keys: %s", self.url, e)
+            self._fetched = time.monotonic()
+            self._expires = self._fetched + self.retry_after
+            return
+
+        self._keys = keys
+        self._fetched = time.monotonic()
+        self._expires = self._fetched + self._max_age(response)
+
+    def _max_age(self, response):
+        match = re.search(r'max-age=(\d+)', response.headers.get('cache-control', ''))
+        return int(match.group(1)) if match else self.default_max_age
+
+
+_caches = {}
+
+
+def get_jwks(url):
+    if url not in _caches:
+        _caches[url] = JWKSCache(url)
+    return _caches[url]
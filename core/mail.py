@@ -0,0 +1,128 @@
+import atexit
+import smtplib
+import threading
+import time
+from django.conf import settings
+from django.core.mail.backends.smtp import EmailBackend
+
+
+class PooledEmailBackend(EmailBackend):
+    """
+    SMTP backend that keeps authenticated connections open between sends.
+
+    open() borrows a connection from a per-process pool and close() gives it
+    back instead of sending QUIT, so once the pool is warm a message costs the
+    MAIL/RCPT/DATA exchange only, not a TLS handshake and login. Connections
+    idle for longer than EMAIL_POOL_IDLE_TIMEOUT are dropped, and a send that
+    fails on a dead pooled connection is retried once on a fresh one.
+    """
+
+    _pools = {}
+    _pool_lock = threading.Lock()
+
+    def __init__(self, *args, pool_size=None, idle_timeout=None, batch_size=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_size = pool_size or getattr(settings, 'EMAIL_POOL_SIZE', 4)
+        self.idle_timeout = idle_timeout or getattr(settings, 'EMAIL_POOL_IDLE_TIMEOUT', 60)
+        self.batch_size = batch_size or getattr(settings, 'EMAIL_BATCH_SIZE', 50)
+        self._pool_key = (self.host, self.port, self.username, self.use_tls, self.use_ssl)
+        self._reused = False
+
+    def open(self):
+        if self.connection:
+            return False
+
+        now = time.monotonic()
+        stale = []
+        with self._pool_lock:
+            pool = self._pools.setdefault(self._pool_key, [])
+            while pool:
+                connection, last_used = pool.pop()
+                if now - last_used < self.idle_timeout:
+                    self.connection = connection
+                    break
+                stale.append(connection)
+        for connection in stale:
+            self._quit(connection)
+
+        if self.connection:
+            self._reused = True
+            return True
+        self._reused = False
+        return super().open()
+
+    def close(self):
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        with self._pool_lock:
+            pool = self._pools.setdefault(self._pool_key, [])
+            if len(pool) < self.pool_size:
+                pool.append((connection, time.monotonic()))
+                return
+        self._quit(connection)
+
+    def send_messages(self, email_messages):
+        # Hold a connection for at most batch_size messages so one big
+        # send_mass_mail doesn't pin a pooled connection for its whole run.
+        email_messages = list(email_messages)
+        num_sent = 0
+        for start in range(0, len(email_messages), self.batch_size):
+            num_sent += super().send_messages(email_messages[start:start + self.batch_size])
+        return num_sent
+
+    def _send(self, email_message):
+        fail_silently, self.fail_silently = self.fail_silently, False
+        try:
+            if self.connection is None:
+                # An earlier message in this batch dropped the connection.
+                super().open()
+            return super()._send(email_message)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self._drop()
+            # The server may have timed out a pooled connection, retry once
+            # on a new one before giving up.
+            if self._reused and super().open():
+                self._reused = False
+                try:
+                    return super()._send(email_message)
+                except (smtplib.SMTPException, OSError):
+                    self._drop()
+                    if not fail_silently:
+                        raise
+                    return False
+            if not fail_silently:
+                raise
+            return False
+        except smtplib.SMTPException:
+            if not fail_silently:
+                raise
+            return False
+        finally:
+            self.fail_silently = fail_silently
+
+    def _drop(self):
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            self._quit(connection)
+
+    @staticmethod
+    def _quit(connection):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+    @classmethod
+    def close_all(cls):
+        with cls._pool_lock:
+            connections = [connection for pool in cls._pools.values() for connection, _ in pool]
+            cls._pools.clear()
+        for connection in connections:
+            cls._quit(connection)
+
+
+atexit.register(PooledEmailBackend.close_all)
@@ -1,4 +1,14 @@
-from rest_framework.pagination import PageNumberPagination,CursorPagination
+import base64
+import hashlib
+import json
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class CustomLimitPagination(PageNumberPagination):
     page_size = 10
@@ -10,15 +20,172 @@ class MyCursorPagination(CursorPagination):
     ordering = '-created_at'
 
 
+def estimate_table_rows(queryset):
+    """Planner row estimate for the whole table, None when unavailable."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 until the table has been analyzed.
+    return row[0] if row and row[0] >= 0 else None
+
+
+def keyset_filter(ordering, values):
+    """
+    Q for rows strictly after `values` in `ordering`, e.g. for
+    ('-date_joined', '-id'): date_joined < v0 OR (date_joined = v0 AND id < v1).
+    """
+    condition = Q()
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f"{name}__{lookup}": values[index]})
+        for previous, value in zip(ordering[:index], values):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+    return condition
+
+
+def approximate_count(queryset, timeout=60):
+    """
+    Row count without a full COUNT(*) where possible: the planner's estimate
+    on Postgres, otherwise an exact count cached for `timeout` seconds.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        if not queryset.query.where:
+            estimate = estimate_table_rows(queryset)
+            if estimate is not None:
+                return estimate
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    key = "count:" + hashlib.md5(f"{queryset.db}:{queryset.query}".encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination on a composite ordering (by default created_at with
+    id as tiebreaker), so pages stay stable when timestamps collide and deep
+    pages cost the same as the first. Cursors are opaque. Pass ?total=approx
+    to get an approximate total alongside the results.
+    """
+
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    max_page_size = 100
+    limit_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    total_query_param = 'total'
+    count_cache_timeout = 60
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        ordering = self.active_ordering = getattr(view, 'keyset_ordering', None) or self.ordering
+        queryset = queryset.order_by(*ordering)
+
+        self.total = None
+        if request.query_params.get(self.total_query_param) == 'approx':
+            self.total = approximate_count(queryset, self.count_cache_timeout)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(ordering, position))
+
+        rows = list(queryset[:self.limit + 1])
+        self.next_position = None
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            last = rows[-1]
+            self.next_position = [getattr(last, field.lstrip('-')) for field in ordering]
+        return rows
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(limit, self.max_page_size))
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(position, list) or len(position) != len(self.active_ordering):
+            raise NotFound('Invalid cursor')
+        # Each value goes through its field, so a tampered cursor is a 404
+        # here rather than a database error in the keyset filter.
+        try:
+            values = [
+                self.ordering_field(model, name).to_python(value)
+                for name, value in zip(self.active_ordering, position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if None in values:
+            raise NotFound('Invalid cursor')
+        return values
+
+    def ordering_field(self, model, name):
+        name = name.lstrip('-')
+        return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+    def encode_cursor(self, position):
+        # str() rather than DjangoJSONEncoder, which cuts datetimes to
+        # milliseconds and would skip rows sharing the last one's.
+        encoded = base64.urlsafe_b64encode(json.dumps(position, default=str).encode())
+        return encoded.decode()
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        payload = {'next': self.get_next_link(), 'results': data}
+        if self.total is not None:
+            payload['total'] = self.total
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'total': {'type': 'integer', 'description': 'Approximate, only with ?total=approx'},
+                'results': schema,
+            },
+        }
+
+
 def paginate_response(
     request,
     queryset,
     serializer_class,
-    paginator_class,
+    paginator_class=KeysetPagination,
     extra_data=None,
-    context=None
+    context=None,
+    ordering=None,
 ):
     paginator = paginator_class()
+    if ordering:
+        paginator.ordering = ordering
     page = paginator.paginate_queryset(queryset, request)
 
     serializer = serializer_class(
@@ -1,3 +1,27 @@
 from rest_framework.permissions import BasePermission
 
+# These only read the claims added by core.tokens.UserRefreshToken, so they
+# never need the user row. Stale claims are rejected at authentication via
+# the auth_version check.
 
+
+class IsNotBlockedClaim(BasePermission):
+
+    def has_permission(self, request, view):
+        claims = request.auth
+        return claims is not None and not claims.get('block', False)
+
+
+class HasRoleClaim(IsNotBlockedClaim):
+    role = None
+
+    def has_permission(self, request, view):
+        return super().has_permission(request, view) and request.auth.get('role') == self.role
+
+
+class IsAdminClaim(HasRoleClaim):
+    role = 'admin'
+
+
+class IsUserClaim(HasRoleClaim):
+    role = 'user'
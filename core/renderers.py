@@ -0,0 +1,54 @@
+import math
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+def _has_non_finite(data):
+    # Iterative, and strings and None (most values) are skipped first: this
+    # runs on most responses.
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if item is None or type(item) is str:
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif isinstance(item, float) and item - item != 0:
+            # NaN, and Infinity since inf - inf is NaN.
+            return True
+    return False
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer on orjson. UUIDs, dicts and lists are encoded natively;
+    datetimes, Decimals, lazy strings and anything else orjson doesn't know
+    go through DRF's encoder so the output matches JSONRenderer. Indented,
+    ASCII-only or non-compact output, and anything orjson rejects (ints
+    beyond 64 bits, say), is left to the stdlib renderer. So is NaN/Infinity,
+    which orjson writes as null: JSONRenderer raises on it (or writes NaN
+    with STRICT_JSON off). The data is only searched for them when the
+    output has a null.
+    """
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'null' in ret and _has_non_finite(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like JSONRenderer does: U+2028/U+2029 are valid in JSON but
+        # end a string literal in JavaScript before ES2019.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,173 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+
+class BloomFilter:
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        self.update((item,))
+
+    def update(self, items):
+        # add() for many items, with the lookups hoisted out of the loop.
+        bits, size, offsets = self.bits, self.size, range(self.hashes)
+        blake2b, from_bytes = hashlib.blake2b, int.from_bytes
+        count = 0
+        for item in items:
+            digest = blake2b(item.encode(), digest_size=16).digest()
+            h1 = from_bytes(digest[:8], 'little')
+            h2 = from_bytes(digest[8:], 'little') | 1
+            for i in offsets:
+                position = (h1 + i * h2) % size
+                bits[position >> 3] |= 1 << (position & 7)
+            count += 1
+        self.count += count
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """
+    Revoked jtis live in the accounts.RevokedToken table. Each worker keeps a
+    Bloom filter of them that it tops up every `refresh_interval` seconds and
+    rebuilds from scratch every `rebuild_interval` so expired entries fall
+    out. Most tokens miss the filter and are cleared in memory, only filter
+    hits are confirmed against the table.
+
+    Only the top-up runs on the request path. Full builds run on a
+    background thread while the old filter keeps being served, and are
+    swapped in once complete. Until a worker's first filter is ready every
+    check goes to the table.
+    """
+
+    # Overlap between incremental loads so a row committed just after the
+    # previous load started is not skipped.
+    OVERLAP = timedelta(seconds=5)
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001, refresh_interval=5, rebuild_interval=600):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._filter = None
+        self._watermark = None
+        self._refreshed = 0.0
+        self._rebuilt = 0.0
+        self._rebuild_thread = None
+        self._revoked_during_rebuild = []
+        self._lock = threading.Lock()
+        self._stats = {'checks': 0, 'filter_hits': 0, 'unfiltered': 0, 'revoked': 0, 'rebuilds': 0}
+
+    def _model(self):
+        return apps.get_model('accounts', 'RevokedToken')
+
+    def _jtis(self, **filters):
+        return self._model().objects.filter(**filters).values_list('jti', flat=True).iterator(chunk_size=10000)
+
+    def _start_rebuild(self):
+        with self._lock:
+            if self._rebuild_thread is not None:
+                return
+            self._revoked_during_rebuild = []
+            self._rebuild_thread = threading.Thread(target=self._rebuild, name='revocation-rebuild', daemon=True)
+        self._rebuild_thread.start()
+
+    def _rebuild(self):
+        try:
+            started = timezone.now()
+            bloom = BloomFilter(self.capacity, self.error_rate)
+            bloom.update(self._jtis(expires_at__gt=started))
+            # Catch up on what was revoked while the bulk load ran. Anything
+            # later is the next top-up's, except this worker's own revokes,
+            # which must be in the filter the moment it is swapped in.
+            watermark, refreshed = timezone.now(), time.monotonic()
+            bloom.update(self._jtis(created_at__gte=started - self.OVERLAP))
+            with self._lock:
+                bloom.update(self._revoked_during_rebuild)
+                self._filter = bloom
+                self._watermark = watermark
+                self._refreshed = refreshed
+                self._rebuilt = time.monotonic()
+                self._stats['rebuilds'] += 1
+        finally:
+            connections.close_all()
+            with self._lock:
+                self._rebuild_thread = None
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._filter is None or now - self._rebuilt > self.rebuild_interval:
+            self._start_rebuild()
+        if self._filter is None or now - self._refreshed < self.refresh_interval:
+            return
+        with self._lock:
+            if now - self._refreshed < self.refresh_interval:
+                return
+            watermark = timezone.now()
+            self._filter.update(self._jtis(created_at__gte=self._watermark - self.OVERLAP))
+            self._watermark = watermark
+            self._refreshed = now
+
+    def is_revoked(self, jti):
+        self._refresh()
+        self._stats['checks'] += 1
+        bloom = self._filter
+        if bloom is None:
+            self._stats['unfiltered'] += 1
+        elif jti not in bloom:
+            return False
+        else:
+            self._stats['filter_hits'] += 1
+        revoked = self._model().objects.filter(jti=jti).exists()
+        if revoked:
+            self._stats['revoked'] += 1
+        return revoked
+
+    def revoke(self, token):
+        jti = token[settings.SIMPLE_JWT.get('JTI_CLAIM', 'jti')]
+        expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+        self._model().objects.get_or_create(jti=jti, defaults={'expires_at': expires_at})
+        self._refresh()
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+            if self._rebuild_thread is not None:
+                self._revoked_during_rebuild.append(jti)
+
+    def stats(self):
+        bloom = self._filter
+        return {
+            **self._stats,
+            'rebuilding': self._rebuild_thread is not None,
+            'entries': bloom.count if bloom else 0,
+            'size_bytes': len(bloom.bits) if bloom else 0,
+            'hashes': bloom.hashes if bloom else 0,
+        }
+
+
+_config = getattr(settings, 'TOKEN_REVOCATION', {})
+revocation_list = RevocationList(
+    capacity=_config.get('CAPACITY', 1_000_000),
+    error_rate=_config.get('ERROR_RATE', 0.001),
+    refresh_interval=_config.get('REFRESH_INTERVAL', 5),
+    rebuild_interval=_config.get('REBUILD_INTERVAL', 600),
+)
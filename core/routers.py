@@ -0,0 +1,81 @@
+import random
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+# Set once the current request has written, or when its client wrote within
+# the last DATABASE_REPLICA_PIN_SECONDS. Pinned requests read from the primary.
+_pinned = ContextVar('db_pinned', default=False)
+_wrote = ContextVar('db_wrote', default=False)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or _pinned.get():
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        _pinned.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def _pin_key(request):
+    # Clients are told apart by their JWT user, or the session cookie for
+    # the admin.
+    parts = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(parts) == 2 and parts[0] == 'Bearer':
+        try:
+            return f"db:pin:{AccessToken(parts[1])[api_settings.USER_ID_CLAIM]}"
+        except (TokenError, KeyError):
+            return None
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    return f"db:pin:session:{session_key}" if session_key else None
+
+
+@sync_and_async_middleware
+def replica_pinning_middleware(get_response):
+    pin_seconds = settings.DATABASE_REPLICA_PIN_SECONDS
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            key = _pin_key(request)
+            pinned = _pinned.set(bool(key) and await cache.aget(key) is not None)
+            wrote = _wrote.set(False)
+            try:
+                response = await get_response(request)
+                if key and _wrote.get():
+                    await cache.aset(key, 1, pin_seconds)
+            finally:
+                _pinned.reset(pinned)
+                _wrote.reset(wrote)
+            return response
+    else:
+        def middleware(request):
+            key = _pin_key(request)
+            pinned = _pinned.set(bool(key) and cache.get(key) is not None)
+            wrote = _wrote.set(False)
+            try:
+                response = get_response(request)
+                if key and _wrote.get():
+                    cache.set(key, 1, pin_seconds)
+            finally:
+                _pinned.reset(pinned)
+                _wrote.reset(wrote)
+            return response
+
+    return middleware
@@ -0,0 +1,80 @@
+from functools import cached_property
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+from rest_framework.settings import api_settings
+
+
+def _file_url(value, request):
+    # FileField.to_representation with use_url.
+    try:
+        url = value.url
+    except AttributeError:
+        return None
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+class CompiledRepresentation:
+    """
+    Read-only stand-in for `serializer_class(instance, context={'request':
+    request}).data`. The readable fields are resolved once per process into
+    a flat list of (name, attribute, converter) and replayed for every
+    instance, skipping field introspection and the generic to_representation
+    dispatch. Supports flat model fields, file fields and
+    SerializerMethodFields; any other field type (nested serializers,
+    relations, dotted sources) falls back to the serializer.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    @cached_property
+    def plan(self):
+        prototype = self.serializer_class()
+        plan = []
+        for field in prototype._readable_fields:
+            if isinstance(field, serializers.SerializerMethodField):
+                plan.append((field.field_name, None, ('method', field.method_name)))
+                continue
+            if isinstance(field, (serializers.BaseSerializer, RelatedField, ManyRelatedField)):
+                return None
+            if len(field.source_attrs) != 1:
+                return None
+
+            if isinstance(field, serializers.FileField):
+                if getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+                    convert = ('file', _file_url)
+                else:
+                    convert = ('file', lambda value, request: value.name)
+            elif isinstance(field, serializers.CharField):
+                convert = ('plain', str)
+            elif isinstance(field, serializers.UUIDField) and field.uuid_format == 'hex_verbose':
+                convert = ('plain', str)
+            else:
+                convert = ('plain', field.to_representation)
+            plan.append((field.field_name, field.source_attrs[0], convert))
+        return plan
+
+    def __call__(self, instance, request=None):
+        plan = self.plan
+        context = {'request': request} if request is not None else {}
+        if plan is None:
+            return self.serializer_class(instance, context=context).data
+
+        serializer = None
+        data = {}
+        for name, attribute, (kind, convert) in plan:
+            if kind == 'method':
+                if serializer is None:
+                    serializer = self.serializer_class(context=context)
+                data[name] = getattr(serializer, convert)(instance)
+                continue
+
+            value = getattr(instance, attribute)
+            # Serializer.to_representation: None stays None, empty files too.
+            if value is None or (kind == 'file' and not value):
+                data[name] = None
+            elif kind == 'file':
+                data[name] = convert(value, request)
+            else:
+                data[name] = convert(value)
+        return data
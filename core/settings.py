@@ -20,6 +20,7 @@ STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
 DATA_UPLOAD_MAX_MEMORY_SIZE = 1048576
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '*').split(',')
 STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+APPLE_CLIENT_ID = os.getenv('APPLE_CLIENT_ID')
 CORS_ALLOW_HEADERS = list(default_headers) + ['ngrok-skip-browser-warning',]
 CORS_ALLOW_ORIGINS =  os.getenv('CORS_ALLOW_ORIGINS', 'localhost:8000,localhost:3000').split(',')
 CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', 'localhost:8000,localhost:3000').split(',')
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
     'django_filters',
     'rest_framework',
     'rest_framework_simplejwt',
+    'adrf',
     'accounts',
     'payments',
     'subscriptions',
@@ -52,6 +54,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.routers.replica_pinning_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,11 +87,153 @@ TEMPLATES = [
 #     },
 # }
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+# Migrations are generated at deploy time (see docker-compose.yml), so test
+# databases are built straight from the models: 'TEST': {'MIGRATE': False}.
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME'),
+            'USER': os.getenv('DB_USER'),
+            'PASSWORD': os.getenv('DB_PASSWORD'),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+            'TEST': {'MIGRATE': False},
+            'OPTIONS': {
+                'connect_timeout': 5,
+            },
+        }
+    }
+    # Server side cap so a runaway query can't hold a connection. Only the
+    # web entry points (asgi.py, wsgi.py) set DB_STATEMENT_TIMEOUT, so
+    # migrations, management commands and celery tasks run without one.
+    if os.getenv('DB_STATEMENT_TIMEOUT'):
+        DATABASES['default']['OPTIONS']['options'] = f"-c statement_timeout={os.getenv('DB_STATEMENT_TIMEOUT')}"
+    # The psycopg pool is the right choice under ASGI, where persistent
+    # connections are per request context. Django refuses both at once.
+    if os.getenv('DB_POOL', 'True') == 'True':
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': 10,
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 60))
+else:
+    # WAL lets readers run alongside the single writer, IMMEDIATE takes the
+    # write lock up front so concurrent writers queue on the busy timeout
+    # instead of failing with "database is locked".
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'TEST': {'MIGRATE': False},
+            'OPTIONS': {
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+        }
+    }
+
+# Read replicas: DB_REPLICA_HOSTS is a comma separated list of hosts serving
+# copies of the primary. DB_FAKE_REPLICA adds a 'replica' alias on the same
+# database, so the routing can be exercised locally and in tests.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+if os.getenv('DB_FAKE_REPLICA', 'False') == 'True':
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append('replica')
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+# Admin changelist counts on a filtered table may take longer than the web
+# statement_timeout, in milliseconds.
+ADMIN_COUNT_STATEMENT_TIMEOUT = int(os.getenv('DB_ADMIN_COUNT_TIMEOUT', 30000))
+# How long a client's reads stay on the primary after it wrote.
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+
+REDIS_HOST = os.getenv('REDIS_HOST', '127.0.0.1')
+
+# Shared between workers through redis when REDIS_HOST is set, otherwise a
+# per-process locmem cache for local development.
+if os.getenv('REDIS_HOST'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f'redis://{REDIS_HOST}:6379/1',
+        }
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# OTP codes live in the cache with a native TTL when the cache is shared
+# (redis). A per-process locmem cache would only let the worker that issued a
+# code verify it, so without REDIS_HOST they go to the OTP table instead.
+OTP_STORE = os.getenv(
+    'OTP_STORE',
+    'accounts.otp.CacheOTPStore' if os.getenv('REDIS_HOST') else 'accounts.otp.ModelOTPStore',
+)
+OTP_TTL = 180
+OTP_MAX_ATTEMPTS = 5
+
+# Shared outbound HTTP clients, see core.http.
+OUTBOUND_HTTP = {
+    'TIMEOUT': 10,
+    'CONNECT_TIMEOUT': 5,
+    'POOL_TIMEOUT': 5,
+    'MAX_CONNECTIONS': 50,
+    'MAX_KEEPALIVE': 20,
+}
+
+# Provider profile pictures are fetched by accounts.tasks.fetch_avatar.
+AVATAR_SIZE = 512
+AVATAR_MAX_BYTES = 5 * 1024 * 1024
+AVATAR_MAX_CONCURRENT_DOWNLOADS = 4
+
+# Longest edge in pixels of the renditions built for User.image/User.cover.
+IMAGE_RENDITIONS = {
+    'thumb': 128,
+    'medium': 512,
+    'full': 1600,
+}
+# Uploads and downloads with more pixels than this are refused from their
+# header, before they are decoded.
+IMAGE_MAX_PIXELS = 40_000_000
+
+# Users resolved by core.authentication.CachedJWTAuthentication. Like the OTP
+# store, the cache tiers need a cache every worker shares: with the locmem
+# fallback a save would only invalidate the worker that made it, so without
+# REDIS_HOST every request reads the user row instead.
+AUTH_USER_CACHE = {
+    'SHARED': bool(os.getenv('REDIS_HOST')),
+    'SIZE': 1024,
+    'LOCAL_TTL': 30,
+    'SHARED_TTL': 300,
+}
+
+# Password hashing runs on a process pool, LIMITS caps concurrent hashes per
+# endpoint label. TIMEOUT is how long a request waits for a slot, 0 = fail fast.
+PASSWORD_HASHING = {
+    'WORKERS': int(os.getenv('PASSWORD_HASHING_WORKERS', 2)),
+    'TIMEOUT': float(os.getenv('PASSWORD_HASHING_TIMEOUT', 2)),
+    'LIMITS': {
+        'default': 8,
+        'signin': 6,
+        'signup': 4,
+        'reset': 2,
+        'profile': 2,
+    },
 }
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -119,14 +264,42 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Chunked uploads are assembled here, outside MEDIA_ROOT so partial files are
+# never served, but on the same volume so finalize can rename them in place.
+CHUNKED_UPLOAD_DIR = BASE_DIR / "uploads_tmp"
+CHUNKED_UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_SIZE = 200 * 1024 * 1024
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
         ),
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend",
         'rest_framework.filters.OrderingFilter',
         ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        ],
+    # Proxies in front of the app (nginx), so throttles key on the client
+    # address instead of a spoofable X-Forwarded-For.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES')) if os.getenv('NUM_PROXIES') else None,
+    # Sliding-window budgets for the unauthenticated auth endpoints, see
+    # core.throttling. Each scope is limited per client IP and per email.
+    'DEFAULT_THROTTLE_RATES': {
+        'signin_ip': os.getenv('THROTTLE_SIGNIN_IP', '30/min'),
+        'signin_email': os.getenv('THROTTLE_SIGNIN_EMAIL', '10/min'),
+        'otp_issue_ip': os.getenv('THROTTLE_OTP_ISSUE_IP', '20/hour'),
+        'otp_issue_email': os.getenv('THROTTLE_OTP_ISSUE_EMAIL', '5/hour'),
+        'otp_verify_ip': os.getenv('THROTTLE_OTP_VERIFY_IP', '60/hour'),
+        'otp_verify_email': os.getenv('THROTTLE_OTP_VERIFY_EMAIL', '10/hour'),
+        },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.CursorPagination',
     'PAGE_SIZE': None,
     }
@@ -134,11 +307,52 @@ REST_FRAMEWORK = {
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=7),
-    'REFRESH_TOKEN_LIFETIME': timedelta(days=30)
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=30),
+    'TOKEN_OBTAIN_SERIALIZER': 'core.tokens.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'core.tokens.TokenRefreshSerializer',
+}
+
+# Revoked jtis are kept in accounts.RevokedToken and mirrored into a per-worker
+# Bloom filter, refreshed every REFRESH_INTERVAL and rebuilt every
+# REBUILD_INTERVAL seconds.
+TOKEN_REVOCATION = {
+    'CAPACITY': 1_000_000,
+    'ERROR_RATE': 0.001,
+    'REFRESH_INTERVAL': 5,
+    'REBUILD_INTERVAL': 600,
+}
+
+
+# Set CELERY_BROKER_URL=memory:// and CELERY_TASK_ALWAYS_EAGER=True to run
+# tasks in-process (tests, local development without redis).
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', f'redis://{REDIS_HOST}:6379/0')
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'purge-otps': {
+        'task': 'accounts.tasks.purge_otps',
+        'schedule': 600,
+    },
+    'purge-revoked-tokens': {
+        'task': 'accounts.tasks.purge_revoked_tokens',
+        'schedule': 3600,
+    },
+    'purge-upload-sessions': {
+        'task': 'accounts.tasks.purge_upload_sessions',
+        'schedule': 3600,
+    },
 }
 
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'core.mail.PooledEmailBackend')
+EMAIL_TIMEOUT = 10
+EMAIL_POOL_SIZE = int(os.getenv('EMAIL_POOL_SIZE', 4))
+EMAIL_POOL_IDLE_TIMEOUT = int(os.getenv('EMAIL_POOL_IDLE_TIMEOUT', 60))
+EMAIL_BATCH_SIZE = 50
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -0,0 +1,794 @@
+import asyncio
+import base64
+import json
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from aiosmtpd.controller import Controller
+from asgiref.sync import sync_to_async
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.db import connection, router
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from accounts.admin import OTPAdmin, UserAdmin
+from accounts.models import OTP, RevokedToken
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from .authentication import CachedJWTAuthentication, UserCache
+from .hashing import HashingBusy, HashingExecutor
+from .http import get_async_client
+from .jwks import JWKSCache
+from .mail import PooledEmailBackend
+from .permissions import IsAdminClaim, IsNotBlockedClaim, IsUserClaim
+from .pagination import KeysetPagination
+from .renderers import ORJSONRenderer
+from .routers import _pinned, replica_pinning_middleware
+from .tokens import UserRefreshToken
+from .utils import statement_timeout
+from .throttling import EmailRateThrottle, IPRateThrottle, SlidingWindowThrottle
+from .revocation import RevocationList
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class _RecordingHandler:
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return '250 OK'
+
+
+class LocalSMTPMixin:
+    """Runs an aiosmtpd server on localhost for the duration of each test."""
+
+    def setUp(self):
+        super().setUp()
+        PooledEmailBackend.close_all()
+        self.port = _free_port()
+        self.handler = _RecordingHandler()
+        self.server = None
+        self.start_server()
+        self.addCleanup(PooledEmailBackend.close_all)
+        self.addCleanup(self.stop_server)
+
+    def start_server(self):
+        self.server = Controller(self.handler, hostname='127.0.0.1', port=self.port)
+        self.server.start()
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+    def backend(self, **kwargs):
+        return PooledEmailBackend(
+            host='127.0.0.1', port=self.port, username='', password='',
+            use_tls=False, use_ssl=False, timeout=5, **kwargs,
+        )
+
+    def send(self, backend, count=1):
+        messages = [
+            EmailMessage(f'OTP {index}', 'Your code is 1234', 'noreply@example.com', ['user@example.com'])
+            for index in range(count)
+        ]
+        return backend.send_messages(messages)
+
+
+class _StubHTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        with server.lock:
+            server.requests.append((url.path, self.client_address))
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            time.sleep(server.delay)
+            status, headers, body = server.routes[url.path](parse_qs(url.query), self.headers)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in {'Content-Type': 'application/json', **headers}.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalHTTPMixin:
+    """
+    Runs a stub HTTP server on localhost for the duration of each test.
+    `self.http.routes` maps a path to `callable(query, headers)` returning
+    (status, headers, body), and every request is recorded with the client
+    address it came from, so tests can count connections.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.http = ThreadingHTTPServer(('127.0.0.1', 0), _StubHTTPHandler)
+        self.http.daemon_threads = True
+        self.http.lock = threading.Lock()
+        self.http.routes, self.http.requests = {}, []
+        self.http.active = self.http.peak = 0
+        self.http.delay = 0
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        self.addCleanup(self.http.server_close)
+        self.addCleanup(self.http.shutdown)
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.http.server_port}{path}'
+
+    def requests_to(self, path):
+        return [request for request in self.http.requests if request[0] == path]
+
+    @property
+    def connections(self):
+        return {address for _, address in self.http.requests}
+
+
+class PooledEmailBackendTests(LocalSMTPMixin, SimpleTestCase):
+
+    def test_connection_is_reused_across_backends(self):
+        self.assertEqual(self.send(self.backend()), 1)
+        self.assertEqual(self.send(self.backend()), 1)
+        self.assertEqual(len(self.handler.messages), 2)
+        self.assertEqual(len(self.handler.sessions), 1)
+
+    def test_batches_share_one_connection(self):
+        self.assertEqual(self.send(self.backend(batch_size=2), count=5), 5)
+        self.assertEqual(len(self.handler.messages), 5)
+        self.assertEqual(len(self.handler.sessions), 1)
+
+    def test_idle_connection_is_recycled(self):
+        self.send(self.backend(idle_timeout=0.05))
+        time.sleep(0.1)
+        self.send(self.backend(idle_timeout=0.05))
+        self.assertEqual(len(self.handler.messages), 2)
+        self.assertEqual(len(self.handler.sessions), 2)
+
+    def test_pool_size_caps_kept_connections(self):
+        first, second = self.backend(pool_size=1), self.backend(pool_size=1)
+        first.open()
+        second.open()
+        first.close()
+        second.close()
+        self.assertEqual(len(PooledEmailBackend._pools[first._pool_key]), 1)
+
+    def test_send_retries_once_after_disconnect(self):
+        self.send(self.backend())
+        # The pooled connection now points at a server that went away.
+        self.stop_server()
+        self.start_server()
+
+        self.assertEqual(self.send(self.backend()), 1)
+        self.assertEqual(len(self.handler.messages), 2)
+        self.assertEqual(len(self.handler.sessions), 2)
+
+    def test_unreachable_server_raises(self):
+        self.stop_server()
+        with self.assertRaises(OSError):
+            self.send(self.backend())
+
+    def test_unreachable_server_fails_silently(self):
+        self.stop_server()
+        self.assertEqual(self.send(self.backend(fail_silently=True)), 0)
+
+
+class UserCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user_cache = UserCache()
+        self.user = get_user_model().objects.create(email='alice@example.com', password='!secret', name='Alice')
+
+    def test_shared_tier_holds_no_credentials(self):
+        self.user_cache.get(self.user.pk)
+        version, values = cache.get(self.user_cache._user_key(self.user.pk))
+        self.assertNotIn('!secret', values)
+        self.assertIn('alice@example.com', values)
+
+    def test_password_is_deferred_and_loaded_on_access(self):
+        user = self.user_cache.get(self.user.pk)
+        self.assertEqual(user.name, 'Alice')
+        self.assertIn('password', user.get_deferred_fields())
+        with self.assertNumQueries(1):
+            self.assertEqual(user.password, '!secret')
+
+    def test_saving_a_cached_user_keeps_password_and_auth_version(self):
+        user = self.user_cache.get(self.user.pk)
+        user.name = 'Alice B'
+        user.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'Alice B')
+        self.assertEqual(self.user.password, '!secret')
+        self.assertEqual(self.user.auth_version, 0)
+
+    def test_served_again_after_invalidation(self):
+        self.user_cache.get(self.user.pk)
+        get_user_model().objects.filter(pk=self.user.pk).update(name='Renamed')
+        self.user_cache.invalidate(self.user.pk)
+        self.assertEqual(self.user_cache.get(self.user.pk).name, 'Renamed')
+
+    def test_unknown_or_malformed_pk(self):
+        self.assertIsNone(self.user_cache.get('00000000-0000-0000-0000-000000000000'))
+        self.assertIsNone(self.user_cache.get('not-a-uuid'))
+
+    def test_without_a_shared_cache_rows_are_always_read(self):
+        # Another worker's invalidation never reaches a per-process cache.
+        user_cache = UserCache(shared=False)
+        user_cache.get(self.user.pk)
+        get_user_model().objects.filter(pk=self.user.pk).update(block=True)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(user_cache.get(self.user.pk).block)
+        self.assertIsNone(cache.get(user_cache._user_key(self.user.pk)))
+        self.assertEqual(user_cache._local, {})
+        self.assertIsNone(user_cache.get('not-a-uuid'))
+
+
+class TokenClaimsTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(
+            email='alice@example.com', password='!', role='admin', is_active=True,
+        )
+
+    def request(self, token):
+        request = Request(APIRequestFactory().get('/'))
+        request.auth = token
+        return request
+
+    def test_tokens_carry_role_block_and_version(self):
+        refresh = UserRefreshToken.for_user(self.user)
+        for token in (refresh, refresh.access_token):
+            self.assertEqual(token['role'], 'admin')
+            self.assertIs(token['block'], False)
+            self.assertEqual(token['ver'], self.user.auth_version)
+
+    def test_permissions_decide_from_claims_alone(self):
+        admin = self.request(UserRefreshToken.for_user(self.user).access_token)
+        self.user.block = True
+        self.user.save()
+        blocked = self.request(UserRefreshToken.for_user(self.user).access_token)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(IsAdminClaim().has_permission(admin, None))
+            self.assertFalse(IsUserClaim().has_permission(admin, None))
+            self.assertTrue(IsNotBlockedClaim().has_permission(admin, None))
+            self.assertFalse(IsNotBlockedClaim().has_permission(blocked, None))
+            self.assertFalse(IsAdminClaim().has_permission(blocked, None))
+            self.assertFalse(IsNotBlockedClaim().has_permission(self.request(None), None))
+
+    def test_tokens_are_retired_by_auth_changes(self):
+        authentication = CachedJWTAuthentication()
+        changes = (
+            ('role', lambda user: setattr(user, 'role', 'user')),
+            ('block', lambda user: setattr(user, 'block', True)),
+            ('password', lambda user: user.set_unusable_password()),
+        )
+        for name, change in changes:
+            with self.subTest(name):
+                self.user.block = False
+                self.user.save()
+                token = UserRefreshToken.for_user(self.user).access_token
+                self.assertEqual(authentication.get_user(token).pk, self.user.pk)
+
+                change(self.user)
+                self.user.save()
+                with self.assertRaises(AuthenticationFailed):
+                    authentication.get_user(token)
+
+    def test_other_changes_keep_tokens_valid(self):
+        token = UserRefreshToken.for_user(self.user).access_token
+        self.user.name = 'Alice'
+        self.user.save()
+        self.assertEqual(CachedJWTAuthentication().get_user(token).name, 'Alice')
+
+
+class RevocationListTests(TransactionTestCase):
+
+    def setUp(self):
+        self.revocations = RevocationList(capacity=1000, refresh_interval=0, rebuild_interval=3600)
+
+    def revoked(self, jti):
+        return RevokedToken.objects.create(jti=jti, expires_at=timezone.now() + timedelta(hours=1))
+
+    def wait_for_rebuild(self):
+        thread = self.revocations._rebuild_thread
+        if thread is not None:
+            thread.join(5)
+        self.assertIsNone(self.revocations._rebuild_thread)
+
+    def test_checks_use_the_table_until_the_first_filter_is_ready(self):
+        self.revoked('revoked-jti')
+        self.assertTrue(self.revocations.is_revoked('revoked-jti'))
+        self.wait_for_rebuild()
+
+        self.assertIn('revoked-jti', self.revocations._filter)
+        self.assertFalse(self.revocations.is_revoked('other-jti'))
+        self.assertEqual(self.revocations.stats()['rebuilds'], 1)
+
+    def test_rebuild_runs_off_the_request_path(self):
+        self.revocations.is_revoked('warm-up')
+        self.wait_for_rebuild()
+        old_filter = self.revocations._filter
+
+        release = threading.Event()
+        rebuild = self.revocations._rebuild
+        self.revocations._rebuild = lambda: (release.wait(5), rebuild())
+        self.revocations._rebuilt = time.monotonic() - 7200
+
+        started = time.monotonic()
+        self.revocations.revoke({'jti': 'during-rebuild', 'exp': int(time.time()) + 3600})
+        self.assertTrue(self.revocations.is_revoked('during-rebuild'))
+        self.assertFalse(self.revocations.is_revoked('other-jti'))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertIs(self.revocations._filter, old_filter)
+        self.assertTrue(self.revocations.stats()['rebuilding'])
+
+        release.set()
+        self.wait_for_rebuild()
+        self.assertIsNot(self.revocations._filter, old_filter)
+        self.assertIn('during-rebuild', self.revocations._filter)
+
+    def test_revokes_racing_the_swap_are_in_the_new_filter(self):
+        self.revocations.refresh_interval = 3600
+        self.revocations.is_revoked('warm-up')
+        self.wait_for_rebuild()
+
+        # Hold the rebuild between its catch-up load and the swap.
+        caught_up, release = threading.Event(), threading.Event()
+        jtis = self.revocations._jtis
+
+        def catch_up(**filters):
+            rows = list(jtis(**filters))
+            if 'created_at__gte' in filters:
+                caught_up.set()
+                release.wait(5)
+            return rows
+
+        self.revocations._jtis = catch_up
+        self.revocations._rebuilt = time.monotonic() - 7200
+        self.revocations.is_revoked('other-jti')
+        self.assertTrue(caught_up.wait(5))
+        self.revocations.revoke({'jti': 'racing-the-swap', 'exp': int(time.time()) + 3600})
+
+        release.set()
+        self.wait_for_rebuild()
+        self.assertIn('racing-the-swap', self.revocations._filter)
+
+    def test_top_up_adds_rows_revoked_elsewhere(self):
+        self.revocations.is_revoked('warm-up')
+        self.wait_for_rebuild()
+        self.revoked('from-another-worker')
+        self.assertTrue(self.revocations.is_revoked('from-another-worker'))
+        self.assertIn('from-another-worker', self.revocations._filter)
+
+
+def _jwk(kid):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key()
+    return {**RSAAlgorithm.to_jwk(key, as_dict=True), 'kid': kid, 'alg': 'RS256', 'use': 'sig'}
+
+
+class JWKSCacheTests(LocalHTTPMixin, SimpleTestCase):
+    """JWKSCache against a local stand-in for a provider's JWKS endpoint."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.jwks = {kid: _jwk(kid) for kid in ('first', 'second')}
+
+    def setUp(self):
+        super().setUp()
+        self.serving = ['first']
+        self.status, self.max_age = 200, 3600
+        self.http.routes = {'/keys': self.keys}
+        self.cache = JWKSCache(self.url('/keys'), min_refetch_interval=0, retry_after=60)
+
+    def keys(self, query, headers):
+        body = {'keys': [self.jwks[kid] for kid in self.serving]}
+        return self.status, {'Cache-Control': f'public, max-age={self.max_age}'}, body
+
+    @property
+    def fetches(self):
+        return len(self.requests_to('/keys'))
+
+    async def settle(self):
+        # Background refreshes are not awaited by get_key().
+        if self.cache._inflight is not None:
+            await self.cache._inflight
+
+    async def test_concurrent_lookups_share_one_fetch(self):
+        self.http.delay = 0.1
+        try:
+            keys = await asyncio.gather(*(self.cache.get_key('first') for _ in range(20)))
+        finally:
+            await get_async_client().aclose()
+
+        self.assertEqual(self.fetches, 1)
+        self.assertTrue(all(key is not None for key in keys))
+        self.assertEqual(len({id(key) for key in keys}), 1)
+
+    async def test_unknown_kid_refetches_once_per_interval(self):
+        self.cache.min_refetch_interval = 30
+        try:
+            self.assertIsNotNone(await self.cache.get_key('first'))
+            self.cache._fetched -= 30
+            # The provider rotated in a new key.
+            self.serving = ['first', 'second']
+            self.assertIsNotNone(await self.cache.get_key('second'))
+            self.assertEqual(self.fetches, 2)
+
+            # Garbage kids don't hammer the provider.
+            self.assertIsNone(await self.cache.get_key('forged'))
+            self.assertIsNone(await self.cache.get_key('forged'))
+        finally:
+            await get_async_client().aclose()
+        self.assertEqual(self.fetches, 2)
+
+    async def test_keys_are_kept_for_max_age_then_refreshed_in_background(self):
+        try:
+            first = await self.cache.get_key('first')
+            self.assertIs(await self.cache.get_key('first'), first)
+            self.assertEqual(self.fetches, 1)
+
+            self.cache._expires = time.monotonic() - 1
+            self.serving = ['second']
+            # Served from the current keys while the refresh runs.
+            self.assertIs(await self.cache.get_key('first'), first)
+            await self.settle()
+            self.assertEqual(self.fetches, 2)
+            self.assertIsNotNone(await self.cache.get_key('second'))
+            self.assertEqual(self.fetches, 2)
+        finally:
+            await get_async_client().aclose()
+
+        self.assertGreater(self.cache._expires - time.monotonic(), 3500)
+
+    async def test_max_age_comes_from_cache_control(self):
+        self.max_age = 120
+        try:
+            await self.cache.get_key('first')
+        finally:
+            await get_async_client().aclose()
+        self.assertAlmostEqual(self.cache._expires - self.cache._fetched, 120)
+
+    async def test_stale_keys_are_served_while_the_provider_fails(self):
+        try:
+            first = await self.cache.get_key('first')
+            self.cache._expires = time.monotonic() - 1
+            self.status = 503
+
+            with self.assertLogs('core.jwks', 'WARNING'):
+                self.assertIs(await self.cache.get_key('first'), first)
+                await self.settle()
+            self.assertEqual(self.fetches, 2)
+            # Retried after retry_after, not on every call.
+            self.assertIs(await self.cache.get_key('first'), first)
+            self.assertEqual(self.fetches, 2)
+        finally:
+            await get_async_client().aclose()
+
+        self.assertAlmostEqual(self.cache._expires - self.cache._fetched, 60)
+
+
+@skipUnless(connection.vendor == 'postgresql', "statement_timeout is a Postgres setting")
+class StatementTimeoutTests(TransactionTestCase):
+
+    def current(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW statement_timeout")
+            return cursor.fetchone()[0]
+
+    def test_timeout_only_applies_inside_the_block(self):
+        before = self.current()
+        with statement_timeout(12345):
+            self.assertEqual(self.current(), '12345ms')
+        self.assertEqual(self.current(), before)
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.users = [User.objects.create(email=f'user{index}@example.com', password='!') for index in range(5)]
+        cls.view = type('View', (), {'keyset_ordering': ('-date_joined', '-id')})()
+
+    def page(self, **params):
+        paginator = KeysetPagination()
+        request = Request(APIRequestFactory().get('/', params))
+        rows = paginator.paginate_queryset(get_user_model().objects.all(), request, self.view)
+        return rows, paginator
+
+    def cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def test_pages_follow_the_cursor(self):
+        first, paginator = self.page(limit=3)
+        cursor = paginator.encode_cursor(paginator.next_position)
+        second, paginator = self.page(limit=3, cursor=cursor)
+
+        self.assertEqual(first + second, list(get_user_model().objects.order_by('-date_joined', '-id')))
+        self.assertIsNone(paginator.next_position)
+
+    def test_tampered_cursors_are_not_found(self):
+        for position in (['a', 'b'], [{}, []], [None, None], [None], 'not a list'):
+            with self.subTest(position=position), self.assertRaises(NotFound):
+                self.page(cursor=self.cursor(position))
+        with self.assertRaises(NotFound):
+            self.page(cursor='%%%')
+
+
+class KeysetChangelistTests(TestCase):
+    """Walks changelists page by page, as someone clicking "next" would."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create(
+            email='admin@example.com', password='!', is_active=True, is_staff=True, is_superuser=True,
+        )
+        names = ['Bea', None, 'Al', None, 'Cy', None, 'Al']
+        cls.users = [cls.admin] + [
+            User.objects.create(email=f'user{index}@example.com', password='!', name=name)
+            for index, name in enumerate(names)
+        ]
+        cls.otps = [OTP.objects.create(user=user, otp='1234') for user in cls.users[::-1] for _ in range(2)]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        for model_admin in (UserAdmin, OTPAdmin):
+            patcher = mock.patch.object(model_admin, 'list_per_page', 3)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def walk(self, model, **params):
+        url = reverse(f'admin:accounts_{model}_changelist')
+        seen, queries, number = [], [], 1
+        while True:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url, {**params, 'p': number})
+            self.assertEqual(response.status_code, 200)
+            changelist = response.context['cl']
+            seen += [row.pk for row in changelist.result_list]
+            queries.append(captured.captured_queries)
+            if number >= changelist.paginator.num_pages:
+                return seen, queries
+            number += 1
+
+    def assertSeenOnce(self, seen, rows):
+        self.assertEqual(sorted(seen), sorted(row.pk for row in rows))
+
+    def test_default_ordering_pages_by_keyset(self):
+        seen, queries = self.walk('user')
+        self.assertEqual(seen, [user.pk for user in get_user_model().objects.order_by('-date_joined', '-id')])
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries[-1]))
+
+    def test_sorting_by_a_nullable_column(self):
+        for order in ('2', '-2'):
+            with self.subTest(order=order):
+                seen, queries = self.walk('user', o=order)
+                self.assertSeenOnce(seen, self.users)
+
+    def test_sorting_by_a_foreign_key(self):
+        # The user column sorts by User.Meta.ordering, not by user_id.
+        seen, queries = self.walk('otp', o='1')
+        self.assertSeenOnce(seen, self.otps)
+        users = [OTP.objects.get(pk=pk).user_id for pk in seen]
+        self.assertEqual(list(dict.fromkeys(users)), [user.pk for user in get_user_model().objects.all()])
+
+
+class ORJSONRendererTests(SimpleTestCase):
+
+    def assertRendersLikeDRF(self, data):
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_output_matches_json_renderer(self):
+        self.assertRendersLikeDRF({
+            'id': uuid.UUID('0190c7a6-3b1e-7cc2-8f00-2b1f4f0e6a11'),
+            'joined': timezone.now(),
+            'balance': Decimal('10.50'),
+            'label': gettext_lazy('User'),
+            'name': 'Zoë 日本',
+            'tags': ['a', None, True, 3],
+            1: {'nested': []},
+        })
+
+    def test_line_terminators_are_escaped(self):
+        data = {'bio': 'one\u2028two\u2029three'}
+        self.assertRendersLikeDRF(data)
+        self.assertNotIn('\u2028'.encode(), ORJSONRenderer().render(data))
+
+    def test_non_finite_floats_fail_like_json_renderer(self):
+        for value in (float('nan'), float('inf'), -float('inf')):
+            data = {'results': [{'score': value, 'cover': None}]}
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    JSONRenderer().render(data)
+                with self.assertRaises(ValueError):
+                    ORJSONRenderer().render(data)
+                with mock.patch.object(JSONRenderer, 'strict', False):
+                    self.assertRendersLikeDRF(data)
+
+
+@mock.patch.object(SlidingWindowThrottle, 'THROTTLE_RATES', {'test_ip': '3/min', 'test_email': '3/min'})
+class SlidingWindowThrottleTests(SimpleTestCase):
+
+    view = type('View', (), {'throttle_scope': 'test'})()
+
+    def setUp(self):
+        cache.clear()
+        self.now = 600.0
+
+    def hit(self, throttle_class, email='victim@example.com', ip='10.0.0.1'):
+        request = APIRequestFactory().post('/', {'email': email}, format='json', REMOTE_ADDR=ip)
+        throttle = throttle_class()
+        throttle.timer = lambda: self.now
+        return throttle.allow_request(Request(request, parsers=[JSONParser()]), self.view)
+
+    def hammer(self, throttle_class, **kwargs):
+        allowed = [self.hit(throttle_class, **kwargs) for _ in range(20)]
+        self.assertEqual(allowed, [True] * 3 + [False] * 17)
+
+    def test_hammering_an_email_does_not_extend_its_lockout(self):
+        self.hammer(EmailRateThrottle, ip='203.0.113.7')
+        # Half-way into the next window only the three allowed hits weigh.
+        self.now += 90
+        self.assertTrue(self.hit(EmailRateThrottle, ip='10.0.0.1'))
+
+    def test_hammering_from_an_ip_keeps_it_locked_out(self):
+        self.hammer(IPRateThrottle)
+        self.now += 90
+        self.assertFalse(self.hit(IPRateThrottle))
+
+
+class HashingExecutorTests(SimpleTestCase):
+
+    def executor(self, **kwargs):
+        executor = HashingExecutor(workers=1, limits={'signin': 1, 'default': 2}, **kwargs)
+        self.addCleanup(lambda: executor._pool and executor._pool.shutdown())
+        return executor
+
+    def test_each_label_has_its_own_cap(self):
+        executor = self.executor()
+        busy = executor.submit('signin', time.sleep, 0.5)
+        with self.assertRaises(HashingBusy) as raised:
+            executor.submit('signin', time.sleep, 0)
+        self.assertEqual(raised.exception.status_code, 503)
+
+        # Other labels still have their slots.
+        other = executor.submit('signup', time.sleep, 0)
+        other.result(5)
+        busy.result(5)
+        executor.run('signin', time.sleep, 0)
+        self.assertEqual(executor.stats()['labels']['signin']['rejected'], 1)
+        self.assertEqual(executor.stats()['labels']['signin']['completed'], 2)
+
+    def test_timeout_waits_for_a_slot(self):
+        executor = self.executor(timeout=5)
+        busy = executor.submit('signin', time.sleep, 0.3)
+        executor.run('signin', time.sleep, 0)
+        self.assertTrue(busy.done())
+
+    def test_stats_report_queue_depth(self):
+        executor = self.executor()
+        futures = [executor.submit(label, time.sleep, 0.5) for label in ('signin', 'signup', 'signup')]
+        stats = executor.stats()
+        self.assertEqual(stats['in_flight'], 3)
+        # One job runs on the single worker, two wait for it.
+        self.assertEqual(stats['queue_depth'], 2)
+        self.assertEqual(stats['labels']['signup']['in_flight'], 2)
+
+        for future in futures:
+            future.result(5)
+        time.sleep(0.05)
+        self.assertEqual(executor.stats()['queue_depth'], 0)
+
+
+_FAKE_REPLICA = 'replica' in settings.DATABASES
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_PIN_SECONDS=5,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ReplicaPinningTests(TransactionTestCase):
+    """
+    Routes through the 'replica' alias. With DB_FAKE_REPLICA=True the reads
+    also run on it, a mirror of the test database, otherwise only where they
+    would go is checked. A TransactionTestCase, so the mirror connection sees
+    the rows without waiting on a test transaction's lock.
+    """
+    databases = {'default', 'replica'} if _FAKE_REPLICA else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.alice = User.objects.create(email='alice@example.com', password='!')
+        self.bob = User.objects.create(email='bob@example.com', password='!')
+        # The writes above pinned this context to the primary.
+        self.addCleanup(_pinned.reset, _pinned.set(False))
+
+    def view(self, request):
+        users = get_user_model().objects.all()
+        if request.method == 'POST':
+            users.filter(pk=self.alice.pk).update(name='Alice')
+        self.read_from = users.db
+        if _FAKE_REPLICA:
+            list(users)
+        return HttpResponse()
+
+    async def async_view(self, request):
+        return await sync_to_async(self.view)(request)
+
+    def request(self, user, method='get', view=None):
+        token = UserRefreshToken.for_user(user).access_token
+        request = getattr(RequestFactory(), method)('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        replica_pinning_middleware(view or self.view)(request)
+        return self.read_from
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(router.db_for_read(get_user_model()), 'replica')
+        self.assertEqual(self.request(self.alice), 'replica')
+
+    def test_client_reads_from_primary_after_a_write(self):
+        # The request that wrote reads its own write.
+        self.assertEqual(self.request(self.alice, 'post'), 'default')
+        self.assertEqual(self.request(self.alice), 'default')
+        # Other clients are not pinned.
+        self.assertEqual(self.request(self.bob), 'replica')
+
+    def test_pin_expires(self):
+        self.request(self.alice, 'post')
+        later = time.time() + settings.DATABASE_REPLICA_PIN_SECONDS + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertEqual(self.request(self.alice), 'replica')
+
+    async def test_async_requests_are_pinned_too(self):
+        middleware = replica_pinning_middleware(self.async_view)
+        factory = RequestFactory()
+        token = UserRefreshToken.for_user(self.alice).access_token
+        await middleware(factory.post('/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+        self.assertEqual(self.read_from, 'default')
+        await middleware(factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+        self.assertEqual(self.read_from, 'default')
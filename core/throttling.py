@@ -0,0 +1,133 @@
+import hashlib
+import threading
+from rest_framework import status
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TooManyAttempts(Throttled):
+    status_code = status.HTTP_403_FORBIDDEN
+    default_detail = 'Too many attempts.'
+    extra_detail_singular = 'Please try again in {wait} second.'
+    extra_detail_plural = 'Please try again in {wait} seconds.'
+    default_code = 'too_many_attempts'
+
+
+class ThrottleStats:
+    """Per-process allowed/throttled counters by rate name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, name, allowed):
+        with self._lock:
+            counts = self._counts.setdefault(name, {'allowed': 0, 'throttled': 0})
+            counts['allowed' if allowed else 'throttled'] += 1
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._counts.items()}
+
+
+throttle_stats = ThrottleStats()
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Sliding-window counter keyed by `view.throttle_scope` plus `kind`, with
+    its rate under "<scope>_<kind>" in DEFAULT_THROTTLE_RATES. Each fixed
+    window is one integer counter bumped with an atomic incr, and the
+    previous window is weighed by how much of it the sliding window still
+    covers. That is two small keys per client, where SimpleRateThrottle
+    reads and rewrites a list of timestamps that races under load. With
+    `count_rejected`, rejected requests count too, so hammering keeps a
+    client locked out.
+    """
+
+    kind = None
+    count_rejected = True
+
+    def __init__(self):
+        # The rate depends on the view, it is resolved in allow_request().
+        pass
+
+    def get_ident_for(self, request):
+        raise NotImplementedError
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_for(request)
+        if ident is None:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return True
+        self.scope = f"{scope}_{self.kind}"
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window = int(now // self.duration)
+        self.elapsed = now - window * self.duration
+        current_key = f"{self.key}:{window}"
+        # Kept for two windows: one as current, one as previous.
+        self.cache.add(current_key, 0, self.duration * 2)
+        try:
+            self.current = self.cache.incr(current_key)
+        except ValueError:
+            self.cache.set(current_key, 1, self.duration * 2)
+            self.current = 1
+        self.previous = self.cache.get(f"{self.key}:{window - 1}", 0)
+
+        estimate = self.previous * (self.duration - self.elapsed) / self.duration + self.current
+        allowed = estimate <= self.num_requests
+        if not allowed and not self.count_rejected:
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                pass
+            self.current -= 1
+        throttle_stats.record(self.scope, allowed)
+        return allowed
+
+    def wait(self):
+        # Time until the next request's estimate fits the limit again.
+        spare = self.num_requests - self.current - 1
+        if spare >= 0 and self.previous:
+            return max(self.duration - spare * self.duration / self.previous - self.elapsed, 0)
+        # Only once this window has become the previous one.
+        until_next = self.duration - self.elapsed
+        return until_next + max(self.duration - (self.num_requests - 1) * self.duration / self.current, 0)
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    kind = 'ip'
+
+    def get_ident_for(self, request):
+        return self.get_ident(request)
+
+
+class EmailRateThrottle(SlidingWindowThrottle):
+    """
+    Keyed by the `email` in the request body, skipped when there is none.
+    Anyone can send any email, so only allowed requests use up its budget:
+    hammering it must not lock its owner out beyond the window.
+    """
+
+    kind = 'email'
+    count_rejected = False
+
+    def get_ident_for(self, request):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not email or not isinstance(email, str):
+            return None
+        return hashlib.sha1(email.strip().lower().encode()).hexdigest()
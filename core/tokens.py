@@ -0,0 +1,37 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer as BaseTokenObtainPairSerializer,
+    TokenRefreshSerializer as BaseTokenRefreshSerializer,
+)
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .revocation import revocation_list
+
+
+class UserRefreshToken(RefreshToken):
+    """
+    Every token we hand out goes through here so it carries the claims that
+    core.permissions authorizes from. Access tokens copy them from the
+    refresh token, including ones minted later by the refresh endpoint.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['role'] = user.role
+        token['block'] = user.block
+        token['ver'] = user.auth_version
+        return token
+
+
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    token_class = UserRefreshToken
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if revocation_list.is_revoked(refresh[api_settings.JTI_CLAIM]):
+            raise InvalidToken("Token has been revoked")
+        return super().validate(attrs)
@@ -0,0 +1,52 @@
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from django.db import connections, transaction
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7():
+    """
+    Time-ordered UUID (RFC 9562 version 7): 48 bits of unix milliseconds
+    followed by random bits, so new keys land at the right edge of the
+    index. rand_a holds a counter that keeps ids made in the same
+    millisecond by this process in order.
+    """
+    global _last_ms, _counter
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms = ms
+            # Random start with headroom for increments within this ms.
+            _counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_ms += 1
+                _counter = 0
+        ms, counter = _last_ms, _counter
+
+    rand_b = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    return uuid.UUID(int=(ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b)
+
+
+@contextmanager
+def statement_timeout(milliseconds, using='default'):
+    """
+    Replaces the connection's statement_timeout for the queries in the block,
+    which run in a transaction of their own. A no-op off Postgres.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            # is_local: reverts when the transaction ends.
+            cursor.execute("SELECT set_config('statement_timeout', %s, true)", [str(milliseconds)])
+        yield
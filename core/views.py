@@ -0,0 +1,23 @@
+import os
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import permissions
+from . import hashing
+from .revocation import revocation_list
+from .throttling import throttle_stats
+
+
+class MetricsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        # Counters are per worker process, pid tells the workers apart.
+        return Response({
+            "status": True,
+            "log": {
+                "pid": os.getpid(),
+                "hashing": hashing.executor.stats(),
+                "revocation": revocation_list.stats(),
+                "throttling": throttle_stats.stats(),
+            },
+        })
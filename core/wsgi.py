@@ -3,5 +3,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Requests get a statement_timeout, other processes don't (see settings).
+os.environ.setdefault('DB_STATEMENT_TIMEOUT', '5000')
 
 application = get_wsgi_application()
@@ -1,6 +1,12 @@
 # from django.contrib import admin
 # from .models import Payments
-# from unfold.admin import ModelAdmin
+# from core.admin import ScalableModelAdmin
 # # Register your models here.
 
-# admin.site.register(Payments, ModelAdmin)
\ No newline at end of file
+# @admin.register(Payments)
+# class PaymentsAdmin(ScalableModelAdmin):
+#     list_display = ('transaction_id', 'client', 'amount', 'payment_status', 'payment_date')
+#     list_filter = ('payment_status',)
+#     list_select_related = ('client',)
+#     ordering = ('-payment_date', '-id')
+#     autocomplete_fields = ('client',)
@@ -18,6 +18,11 @@
 #     payment_status = models.CharField(max_length=20,choices=STATUS,default='pending')
 #     transaction_id = models.CharField(max_length=20)
 #     invoice_url = models.URLField(blank=True, null=True)
+
+#     class Meta:
+#         indexes = [
+#             models.Index(fields=['-payment_date', '-id'], name='payment_date_idx'),
+#         ]
     
 #     def __str__(self):
 #         return f"{self.booking.booking_id} - {self.payment_status} - {self.amount} - {self.client.email}"
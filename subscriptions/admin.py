@@ -1,7 +1,16 @@
 # from django.contrib import admin
 # from .models import *
-# from unfold.admin import ModelAdmin
+# from core.admin import ScalableModelAdmin
 # # Register your models here.
-# admin.site.register(Plan,ModelAdmin)
-# admin.site.register(Payment,ModelAdmin)
-# admin.site.register(Subscriptions,ModelAdmin)
+
+# @admin.register(Plan)
+# class PlanAdmin(ScalableModelAdmin):
+#     search_fields = ('name',)
+
+# @admin.register(Subscriptions)
+# class SubscriptionsAdmin(ScalableModelAdmin):
+#     list_display = ('user', 'plan', 'start', 'end', 'active')
+#     list_filter = ('active', 'plan')
+#     list_select_related = ('user', 'plan')
+#     ordering = ('-start', '-id')
+#     autocomplete_fields = ('user', 'plan')
@@ -47,6 +47,11 @@
 #     active = models.BooleanField(default=True)
 #     auto_renew = models.BooleanField(default=False)
 
+#     class Meta:
+#         indexes = [
+#             models.Index(fields=['-start', '-id'], name='subscription_start_idx'),
+#         ]
+
 #     def save(self, *args, **kwargs):
 #         if not self.start:
 #             self.start = timezone.now()